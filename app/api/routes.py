@@ -1,78 +1,224 @@
 from fastapi import APIRouter, Query, HTTPException, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Union
-from app.services.upload_service import process_and_upload_document
-from app.services.check_service import vector_store_check
-from app.services.similarity_service import perform_text_similarity, perform_document_similarity
+from app.services.job_service import job_manager
+from app.utils.file_utils import validate_file_type, save_upload
+from app.utils.query_cache import query_cache
+from app.utils.metrics import timed, record_payload
+from app.utils.chunking import create_text_splitter
+from app.utils.async_store import store_reads
+from app.core.config import BATCH_MAX_QUERIES, APP_ROLE
+from app.core.registry import registry
+from app.utils.vector_store import VECTOR_STORE_TYPES
+from app.services.check_service import vector_store_check, vector_store_stats, iter_vector_store
+from app.services.similarity_service import (
+    perform_text_similarity,
+    perform_document_similarity,
+    stream_text_similarity,
+    stream_document_similarity,
+    perform_text_similarity_batch,
+    stream_text_similarity_batch,
+    SEARCH_MODES,
+)
 from app.utils.logger import logger
 from pydantic import BaseModel
 
 router = APIRouter()
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _check_vector_store_type(vector_store_type):
+    if vector_store_type not in VECTOR_STORE_TYPES:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid vector store type: {vector_store_type}. Use one of {VECTOR_STORE_TYPES}."
+        )
+
 # @router.get("/health")
 # async def health_check():
 #     logger.info("Health check endpoint accessed.")
 #     return {"status": "healthy"}
 
-@router.post("/upload/")
+@router.post("/upload/", status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
-    vector_store_type: str = Query("chroma", description="The vector store to use: 'chroma', 'vertexai', or 'mongodb'")
+    vector_store_type: str = Query("chroma", description="The vector store to use: 'chroma', 'local', 'vertexai', or 'mongodb'"),
+    chunk_max_tokens: int = Query(None, description="Maximum tokens per chunk. Defaults to CHUNK_MAX_TOKENS."),
+    chunk_overlap_tokens: int = Query(None, description="Tokens shared by consecutive chunks of a long section. Defaults to CHUNK_OVERLAP_TOKENS."),
+    chunk_strategy: str = Query(None, description="'structure' splits at headings and paragraphs, 'recursive' only at paragraphs, lines and words.")
 ):
     """
-    Endpoint to upload and process a document (PDF or text).
+    Endpoint to upload a document (PDF or text) for background processing.
 
     Args:
         file (UploadFile): The document file to upload.
         vector_store_type (str): The type of vector store to use.
+        chunk_max_tokens, chunk_overlap_tokens, chunk_strategy: Chunking of this upload, stored in chunk metadata.
 
     Returns:
-        dict: Response message with the number of chunks processed.
+        dict: Response message with the id of the ingestion job. Poll `/jobs/{job_id}` for progress.
     """
     logger.info(f"Upload endpoint accessed with file: {file.filename} and vector_store_type: {vector_store_type}")
+    if APP_ROLE == "reader":
+        raise HTTPException(status_code=403, detail="This worker serves queries only. Send uploads to the writer.")
+    validate_file_type(file)
+    _check_vector_store_type(vector_store_type)
+    chunking = create_text_splitter(chunk_max_tokens, chunk_overlap_tokens, chunk_strategy).arguments
     try:
-        response = process_and_upload_document(file, vector_store_type)
-        logger.info(f"Document uploaded and processed successfully: {file.filename}")
-        return response
+        with timed("upload", "save"):
+            temp_file_path = await run_in_threadpool(save_upload, file)
+        record_payload("upload", file.size)
+        job = job_manager.submit(temp_file_path, file.content_type, file.filename, vector_store_type, chunking)
+        return {"message": "Document queued for processing.", "job_id": job.job_id, "status": job.status}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload_document: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/jobs/")
+async def list_jobs():
+    """
+    Endpoint to list ingestion jobs with their status and progress.
+    """
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Endpoint to get the status and progress of one ingestion job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
 class TextSimilarityRequest(BaseModel):
     query: str
     top_n: int
     llm_type: str
     vector_store_type: str
+    search_mode: str = "vector"
+
+def _check_search_mode(search_mode):
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid search mode: {search_mode}. Use one of {SEARCH_MODES}.")
 
 @router.post("/text_similarity/")
 async def text_similarity(request: TextSimilarityRequest):
     """
     Endpoint for Text-Based Similarity Search and LLM Inference.
+    `search_mode` selects vector search, BM25 keyword search ('lexical') or both fused ('hybrid').
     """
     try:
         if not request.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty.")
+        _check_search_mode(request.search_mode)
 
         # Process the similarity logic
         response = await perform_text_similarity(
-            request.query, request.top_n, request.llm_type, request.vector_store_type
+            request.query, request.top_n, request.llm_type, request.vector_store_type, request.search_mode
         )
 
         return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.post("/text_similarity/stream")
+async def text_similarity_stream(request: TextSimilarityRequest):
+    """
+    Streaming endpoint for Text-Based Similarity Search and LLM Inference.
+    Sends the retrieved documents first, then the LLM answer token by token as Server-Sent Events.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    _check_search_mode(request.search_mode)
+    try:
+        events = await stream_text_similarity(
+            request.query, request.top_n, request.llm_type, request.vector_store_type, request.search_mode
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+class TextSimilarityBatchRequest(BaseModel):
+    queries: list[str]
+    top_n: int
+    llm_type: str = "gpt-4o"
+    vector_store_type: str = "chroma"
+    retrieval_only: bool = False
+    stream: bool = False
+
+@router.post("/text_similarity/batch")
+async def text_similarity_batch(request: TextSimilarityBatchRequest):
+    """
+    Endpoint for many Text-Based Similarity Searches in one call.
+    Embeds all queries together, searches in one vectorized call and runs the LLM calls concurrently.
+    With `retrieval_only` no LLM is called; with `stream` results are sent as NDJSON lines in query order.
+    """
+    logger.info(f"Batch text similarity endpoint accessed with {len(request.queries)} queries.")
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Provide at least one query.")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_QUERIES} queries.")
+    if any(not query.strip() for query in request.queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty.")
+    args = (request.queries, request.top_n, request.llm_type, request.vector_store_type, request.retrieval_only)
+    try:
+        if request.stream:
+            lines = await stream_text_similarity_batch(*args)
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+        return await perform_text_similarity_batch(*args)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in text_similarity_batch: {e}")
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Endpoint to report hit and miss counters of the query and embedding caches.
+    """
+    embeddings = registry.get_embeddings()
+    return {
+        "query_cache": query_cache.stats(),
+        "embedding_cache": embeddings.stats() if hasattr(embeddings, "stats") else None,
+    }
 
 @router.get("/inspect/")
-async def inspect_vector_store():
+async def inspect_vector_store(
+    cursor: str = Query(None, description="Cursor returned as next_cursor by the previous page."),
+    limit: int = Query(100, ge=1, le=1000, description="Number of items per page."),
+    include: str = Query("documents,metadatas", description="Comma-separated fields to return: documents, metadatas, embeddings."),
+    where: str = Query(None, description="JSON metadata filter, e.g. {\"source\": \"report.pdf\"}."),
+    stream: bool = Query(False, description="Stream every matching item as NDJSON instead of returning one page."),
+    stats: bool = Query(False, description="Return chunk counts per source without reading document bodies."),
+    vector_store_type: str = Query("chroma", description="The vector store to inspect.")
+):
     """
     Endpoint to inspect the contents of the vector store.
 
     Returns:
-        dict: A dictionary containing the stored texts, metadata, and embeddings.
+        dict: One page of stored texts and metadata with the cursor of the next page,
+        per-source counts when `stats` is set, or an NDJSON stream when `stream` is set.
     """
     logger.info("Inspect vector store endpoint accessed.")
     try:
-        response = vector_store_check()
+        if stats:
+            response = await store_reads.run(vector_store_stats, where, vector_store_type)
+        elif stream:
+            lines = iter_vector_store(limit, include, where, vector_store_type)
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+        else:
+            response = await store_reads.run(vector_store_check, cursor, limit, include, where, vector_store_type)
         logger.info("Vector store inspection completed successfully.")
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in inspect_vector_store: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred while inspecting the vector store: {str(e)}")
@@ -82,7 +228,9 @@ async def document_similarity_search(
     file: UploadFile = File(..., description="Document file for similarity search."),
     top_n: int = Query(5, description="Number of top similar documents to return."),
     llm_type: str = Query("gpt-4o", description="LLM to use: 'gpt-4' or 'gemini'"),
-    vector_store_type: str = Query("chroma", description="The vector store to use: 'chroma', 'vertexai', or 'mongodb'")
+    vector_store_type: str = Query("chroma", description="The vector store to use: 'chroma', 'local', 'vertexai', or 'mongodb'"),
+    mode: str = Query("multi_vector", description="'multi_vector' searches with every chunk of the file, 'single' embeds the whole file as one query"),
+    aggregation: str = Query("max", description="How per-chunk scores are combined in multi_vector mode: 'max', 'mean' or 'topk_sum'")
 ):
     """
     Endpoint for Document Similarity Search.
@@ -97,10 +245,37 @@ async def document_similarity_search(
             raise HTTPException(status_code=400, detail="File must be provided.")
         
         # Perform document similarity search
-        response = await perform_document_similarity(file, top_n, vector_store_type, llm_type)
+        response = await perform_document_similarity(file, top_n, vector_store_type, llm_type, mode, aggregation)
         logger.info("Document similarity search completed successfully.")
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in document_similarity_search: {e}")
-        raise HTTPException(status_code=500, detail=f"An error occurred during document similarity search: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred during document similarity search: {str(e)}")
+
+@router.post("/document_similarity/stream")
+async def document_similarity_stream(
+    file: UploadFile = File(..., description="Document file for similarity search."),
+    top_n: int = Query(5, description="Number of top similar documents to return."),
+    llm_type: str = Query("gpt-4o", description="LLM to use: 'gpt-4' or 'gemini'"),
+    vector_store_type: str = Query("chroma", description="The vector store to use: 'chroma', 'local', 'vertexai', or 'mongodb'"),
+    mode: str = Query("multi_vector", description="'multi_vector' searches with every chunk of the file, 'single' embeds the whole file as one query"),
+    aggregation: str = Query("max", description="How per-chunk scores are combined in multi_vector mode: 'max', 'mean' or 'topk_sum'")
+):
+    """
+    Streaming endpoint for Document Similarity Search.
+    Sends the retrieved documents first, then the LLM answer token by token as Server-Sent Events.
+    """
+    logger.info(f"Streaming document similarity endpoint accessed with file: '{file.filename}', top_n: {top_n}, vector_store_type: {vector_store_type}")
+    if not file or not file.filename.strip():
+        raise HTTPException(status_code=400, detail="File must be provided.")
+    try:
+        events = await stream_document_similarity(file, top_n, vector_store_type, llm_type, mode, aggregation)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in document_similarity_stream: {e}")
+        raise HTTPException(status_code=500, detail=f"An error occurred during document similarity search: {str(e)}")
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,140 @@
+"""
+Application settings:
+Every value can be overridden with an environment variable of the same name.
+"""
+import json
+import os
+
+# Vector store and backup locations
+DATABASE_DIR = os.getenv("DATABASE_DIR", "app/database")
+BACKUP_DIR = os.getenv("BACKUP_DIR", "app/backup")
+
+# Deployment role: 'standalone' serves everything from DATABASE_DIR; a single 'writer' does all
+# uploads and backups and publishes read-only versions of the stores to PUBLISH_DIR; any number of
+# 'reader' processes, e.g. `uvicorn --workers N`, serve queries from the newest published version
+APP_ROLE = os.getenv("APP_ROLE", "standalone")
+PUBLISH_DIR = os.getenv("PUBLISH_DIR", os.path.join(BACKUP_DIR, "published"))
+PUBLISH_KEEP = int(os.getenv("PUBLISH_KEEP", "3"))
+PUBLISH_INTERVAL_SECONDS = float(os.getenv("PUBLISH_INTERVAL_SECONDS", "5"))
+READER_POLL_SECONDS = float(os.getenv("READER_POLL_SECONDS", "2"))
+# Where readers keep their private copy of the Chroma database; a temporary directory if unset
+READER_WORK_DIR = os.getenv("READER_WORK_DIR", "")
+
+# Vector stores opened by the warm-up outside the reader role, comma separated; the routes default to 'chroma'
+# and any other store is opened on first use
+WARMUP_VECTOR_STORES = [name.strip() for name in os.getenv("WARMUP_VECTOR_STORES", "chroma").split(",") if name.strip()]
+
+# Uploads are copied to disk in blocks of UPLOAD_COPY_BLOCK_BYTES and rejected above MAX_UPLOAD_BYTES
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_COPY_BLOCK_BYTES = int(os.getenv("UPLOAD_COPY_BLOCK_BYTES", str(1024 * 1024)))
+# Plain-text uploads are parsed in segments of about this many characters
+TEXT_SEGMENT_CHARS = int(os.getenv("TEXT_SEGMENT_CHARS", str(1024 * 1024)))
+
+# PDFs with at least PDF_PARALLEL_MIN_PAGES pages are parsed in a process pool, PDF_PAGES_PER_TASK pages per task
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+# Default chunking, overridable per upload: chunks of at most CHUNK_MAX_TOKENS tokens, split at
+# headings and paragraphs ('structure') or only at paragraph, line and word boundaries ('recursive')
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "structure")
+
+# Embedding model used for ingestion and queries
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Ingestion embedding pipeline
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_RETRY_BASE_SECONDS = float(os.getenv("EMBED_RETRY_BASE_SECONDS", "1.0"))
+
+# Background ingestion jobs
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOBS_RETAINED = int(os.getenv("INGEST_JOBS_RETAINED", "1000"))
+
+# Embedding cache shared by ingestion and queries
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "app/cache/embeddings.sqlite3")
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "10000"))
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Query response cache
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+# Cosine similarity above which a different query reuses a cached answer; unset disables near-duplicate matching
+QUERY_CACHE_SIMILARITY_THRESHOLD = (
+    float(os.getenv("QUERY_CACHE_SIMILARITY_THRESHOLD")) if os.getenv("QUERY_CACHE_SIMILARITY_THRESHOLD") else None
+)
+
+# Token budget of the retrieved context sent to each chat model, and the budget of any other model
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+CONTEXT_MAX_TOKENS_BY_MODEL = json.loads(os.getenv("CONTEXT_MAX_TOKENS_BY_MODEL", '{"gpt-4": 6000, "gpt-4o": 12000}'))
+
+# Batch text similarity: queries per request and concurrent LLM calls per batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# LLM gateway: completions in flight across all requests, pooled connections and rate-limit retries
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+
+# Vector store thread pools: reads and writes run on separate pools, and calls that would queue
+# beyond the limit are rejected with 429; calls that waited longer than the timeout fail with 503.
+# With APP_ROLE=writer the write pool always has a single worker
+STORE_READ_WORKERS = int(os.getenv("STORE_READ_WORKERS", "4"))
+STORE_READ_MAX_QUEUE = int(os.getenv("STORE_READ_MAX_QUEUE", "64"))
+STORE_WRITE_WORKERS = int(os.getenv("STORE_WRITE_WORKERS", "1"))
+STORE_WRITE_MAX_QUEUE = int(os.getenv("STORE_WRITE_MAX_QUEUE", "16"))
+STORE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("STORE_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Multi-vector document similarity
+DOC_QUERY_MAX_CHUNKS = int(os.getenv("DOC_QUERY_MAX_CHUNKS", "64"))
+DOC_QUERY_SUMMARY_TOKENS = int(os.getenv("DOC_QUERY_SUMMARY_TOKENS", "1000"))
+DOC_SIMILARITY_TOP_K = int(os.getenv("DOC_SIMILARITY_TOP_K", "3"))
+
+# Vector store snapshots
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(BACKUP_DIR, "snapshots"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "5"))
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "600"))
+SNAPSHOT_WRITE_THRESHOLD = int(os.getenv("SNAPSHOT_WRITE_THRESHOLD", "1000"))
+SNAPSHOT_PAGES_PER_STEP = int(os.getenv("SNAPSHOT_PAGES_PER_STEP", "1024"))
+
+# BM25 keyword index kept next to each vector store; hybrid search fuses the keyword and vector
+# rankings, each HYBRID_CANDIDATE_FACTOR times deeper than top_n, by reciprocal rank with constant RRF_K
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(DATABASE_DIR, "lexical"))
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Local in-process vector store
+LOCAL_STORE_DIR = os.getenv("LOCAL_STORE_DIR", os.path.join(DATABASE_DIR, "local"))
+LOCAL_STORE_IVF_MIN_ROWS = int(os.getenv("LOCAL_STORE_IVF_MIN_ROWS", "50000"))
+# IVF searches probe LOCAL_STORE_IVF_PROBE_FRACTION of the lists, and at least LOCAL_STORE_IVF_NPROBE;
+# the number of lists grows with the collection, so a fixed count would lose recall as it grows
+LOCAL_STORE_IVF_NPROBE = int(os.getenv("LOCAL_STORE_IVF_NPROBE", "8"))
+LOCAL_STORE_IVF_PROBE_FRACTION = float(os.getenv("LOCAL_STORE_IVF_PROBE_FRACTION", "0.1"))
+# Compact codes searched first ('float16' or 'int8'; 'none' searches the float32 vectors directly),
+# with the best LOCAL_STORE_RESCORE_FACTOR * k candidates rescored against the float32 vectors
+LOCAL_STORE_QUANTIZATION = os.getenv("LOCAL_STORE_QUANTIZATION", "none")
+LOCAL_STORE_RESCORE_FACTOR = int(os.getenv("LOCAL_STORE_RESCORE_FACTOR", "4"))
+
+# Logging: records are written by a background thread; LOG_FORMAT 'json' writes one JSON object per record
+# with its request id, 'text' the plain format. Messages and context fields are cut at LOG_MAX_FIELD_CHARS,
+# and past LOG_SAMPLE_BURST info records per second from one call site only 1 in LOG_SAMPLE_EVERY is kept
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "10"))
+# Records waiting for the log writer thread; further records are dropped and counted until it catches up
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+# Span export to a local OpenTelemetry collector (OTLP/gRPC), e.g. http://localhost:4317; unset disables it
+TRACE_EXPORT_ENDPOINT = os.getenv("TRACE_EXPORT_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "rag-api")
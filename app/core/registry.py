@@ -0,0 +1,176 @@
+import os
+import threading
+from fastapi import HTTPException
+from app.core.config import (
+    EMBEDDING_MODEL,
+    EMBED_CACHE_ENABLED,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MEMORY_ITEMS,
+    EMBED_CACHE_MAX_BYTES,
+    LEXICAL_INDEX_DIR,
+    APP_ROLE,
+)
+from app.utils.vector_store import initialize_vector_store, create_embeddings
+from app.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from app.utils.llm_gateway import llm_gateway
+from app.utils.async_store import AsyncVectorStore
+from app.utils.lexical_index import LexicalIndex
+from loguru import logger
+
+class ResourceRegistry:
+    """
+    Process-wide holder for vector stores and the clients they depend on.
+
+    Each store type and the embedding client are created on first use and then shared
+    by every request. Creation is guarded by a lock so concurrent requests never build
+    the same resource twice. The FastAPI lifespan in `app/main.py` closes everything on shutdown.
+
+    `use_embeddings` and `use_llm_client` replace the OpenAI clients, e.g. with the offline
+    stand-ins in `benchmarks/fakes.py`. Call them before the first store is created.
+
+    In the 'reader' role stores are never opened from `DATABASE_DIR`: the `VersionWatcher`
+    installs each published version with `install_version`, and store types missing from it
+    are unavailable.
+    """
+
+    def __init__(self, role=APP_ROLE):
+        self.role = role
+        self.version = None
+        self._lock = threading.RLock()
+        self._stores = {}
+        self._lexical_indexes = {}
+        self._embeddings = None
+        self._http_client = None
+
+    def use_embeddings(self, embeddings):
+        """Use `embeddings` instead of the OpenAI embedding client."""
+        with self._lock:
+            self._embeddings = embeddings
+
+    def use_llm_client(self, client):
+        """Send chat completions through `client` instead of the pooled `AsyncOpenAI` client, see `LLMGateway`."""
+        llm_gateway.use_client(client)
+
+    def get_embeddings(self):
+        """
+        Return the shared embedding client, creating it on first use.
+
+        Returns:
+            Embeddings: Embedding client shared by all vector stores.
+        """
+        if self._embeddings is not None:
+            return self._embeddings
+        with self._lock:
+            if self._embeddings is None:
+                import httpx
+                logger.info("Creating shared embedding client.")
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                )
+                embeddings = create_embeddings(http_client=self._http_client)
+                if EMBED_CACHE_ENABLED:
+                    embeddings = CachedEmbeddings(
+                        embeddings,
+                        model=EMBEDDING_MODEL,
+                        disk_store=DiskEmbeddingStore(EMBED_CACHE_PATH, EMBED_CACHE_MAX_BYTES),
+                        memory_items=EMBED_CACHE_MEMORY_ITEMS
+                    )
+                self._embeddings = embeddings
+            return self._embeddings
+
+    def get_vector_store(self, store_type="chroma"):
+        """
+        Return the shared vector store for `store_type`, creating it on first use.
+
+        Args:
+            store_type (str): The type of vector store to use.
+
+        Returns:
+            vectorstore: Initialized vector store object.
+        """
+        vectorstore = self._stores.get(store_type)
+        if vectorstore is not None:
+            return vectorstore
+        if self.role == "reader":
+            raise self._unpublished(store_type)
+        with self._lock:
+            vectorstore = self._stores.get(store_type)
+            if vectorstore is None:
+                logger.info("Initializing shared vector store: {}", store_type)
+                vectorstore = initialize_vector_store(store_type, embeddings=self.get_embeddings())
+                self._stores[store_type] = vectorstore
+            return vectorstore
+
+    def get_lexical_index(self, store_type="chroma"):
+        """
+        Return the BM25 keyword index of the `store_type` store, creating it on first use.
+
+        A new index is filled from the store's existing chunks before it is returned.
+
+        Returns:
+            LexicalIndex: Keyword index shared by ingestion and queries.
+        """
+        index = self._lexical_indexes.get(store_type)
+        if index is not None:
+            return index
+        if self.role == "reader":
+            raise self._unpublished(store_type)
+        with self._lock:
+            index = self._lexical_indexes.get(store_type)
+            if index is None:
+                logger.info("Opening lexical index for vector store: {}", store_type)
+                index = LexicalIndex(os.path.join(LEXICAL_INDEX_DIR, f"{store_type}.sqlite3"))
+                index.sync(self.get_vector_store(store_type))
+                self._lexical_indexes[store_type] = index
+            return index
+
+    @staticmethod
+    def _unpublished(store_type):
+        return HTTPException(
+            status_code=503, detail=f"No published version of the '{store_type}' vector store is available yet."
+        )
+
+    def install_version(self, version, stores, lexical_indexes):
+        """
+        Replace every store and lexical index at once with those of a published version.
+
+        Returns:
+            tuple[dict, dict]: The replaced stores and lexical indexes, for the caller to close.
+        """
+        with self._lock:
+            replaced = self._stores, self._lexical_indexes
+            # Readers look up the dicts without the lock, so swap them instead of mutating
+            self._stores, self._lexical_indexes = dict(stores), dict(lexical_indexes)
+            self.version = version
+        return replaced
+
+    def close(self):
+        """Release every store and client held by the registry."""
+        with self._lock:
+            if "chroma" in self._stores:
+                from chromadb.api.client import SharedSystemClient
+                SharedSystemClient.clear_system_cache()
+            if "local" in self._stores:
+                self._stores["local"].close()
+            self._stores.clear()
+            for index in self._lexical_indexes.values():
+                index.close()
+            self._lexical_indexes.clear()
+            if isinstance(self._embeddings, CachedEmbeddings):
+                self._embeddings.close()
+            self._embeddings = None
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+        logger.info("Resource registry closed.")
+
+registry = ResourceRegistry()
+
+def get_vector_store(store_type="chroma"):
+    """Shortcut for `registry.get_vector_store`."""
+    return registry.get_vector_store(store_type)
+
+def get_async_vector_store(store_type="chroma"):
+    """The shared vector store for `store_type` behind the bounded store thread pools, see `AsyncVectorStore`."""
+    return AsyncVectorStore(registry.get_vector_store(store_type))
@@ -1,8 +1,94 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+from dotenv import load_dotenv
+load_dotenv()  # Load before app modules so app.core.config sees .env values
+import importlib
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from app.api.routes import router
+from app.core.config import MAX_UPLOAD_BYTES, APP_ROLE, WARMUP_VECTOR_STORES
+from app.core.registry import registry
+from app.services.job_service import job_manager
+from app.utils.snapshot import snapshot_manager
+from app.utils.pdf_parsing import pdf_parser
+from app.utils.llm_gateway import llm_gateway
+from app.utils.async_store import shutdown_store_pools
+from app.utils.replication import version_publisher, version_watcher
+from app.utils.warmup import warmup
+from app.utils.metrics import (
+    metrics,
+    REQUEST_SECONDS,
+    collect_timings,
+    span,
+    record_payload,
+    server_timing_header,
+    init_tracing,
+    shutdown_tracing,
+)
+from app.utils.logger import logger
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-load_dotenv()
+
+warmup.record_import(time.perf_counter() - _import_started)
+
+# Client libraries imported on first use; the warm-up loads them before the first request needs them
+DEFERRED_MODULES = ("httpx", "openai", "langchain_openai", "chromadb", "langchain_chroma", "langchain_text_splitters", "pypdf")
+
+def import_deferred_modules():
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
+
+def open_warmup_vector_stores():
+    for vector_store_type in WARMUP_VECTOR_STORES:
+        registry.get_vector_store(vector_store_type)
+
+def warmup_steps():
+    """Startup work done in the background, in order; see `WarmUp`."""
+    steps = [
+        ("imports", import_deferred_modules),
+        ("llm_gateway", llm_gateway.connect),
+        ("embeddings", registry.get_embeddings),
+    ]
+    if APP_ROLE == "reader":
+        steps.append(("vector_store", lambda: version_watcher.start(registry)))
+    else:
+        steps.append(("vector_store", open_warmup_vector_stores))
+    if APP_ROLE == "writer":
+        # After the store is open, so a store restored from a snapshot is published at once
+        steps.append(("publisher", version_publisher.start))
+    return steps
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan:
+    Starts the background snapshot thread and the warm-up, which imports the client libraries
+    and creates the shared vector store, embedding client and LLM client while the app already
+    accepts connections; `/ready` reports when it is done. On shutdown, lets running ingestion jobs finish,
+    takes a final snapshot if needed and then closes the shared clients, including the
+    pooled LLM client.
+    With `APP_ROLE=writer` the version publisher runs as well; with `APP_ROLE=reader` only
+    the published versions are opened and neither snapshots nor uploads run in this process.
+    Span export starts here when `TRACE_EXPORT_ENDPOINT` is set.
+    """
+    app.state.registry = registry
+    init_tracing()
+    logger.info(f"Starting in the '{APP_ROLE}' role.")
+    if APP_ROLE != "reader":
+        snapshot_manager.start()
+    warmup.start(warmup_steps())
+    yield
+    await warmup.stop()
+    job_manager.shutdown()
+    pdf_parser.shutdown()
+    version_publisher.stop()
+    shutdown_store_pools()
+    snapshot_manager.stop()
+    registry.close()
+    version_watcher.stop()
+    await llm_gateway.close()
+    shutdown_tracing()
 """
 Create a FastAPI Instance:
 This initializes the FastAPI app.
@@ -14,10 +100,61 @@ These details appear in the automatically generated API documentation (/docs).
 app = FastAPI(
     title="RAG Application",
     description="A Retrieval-Augmented Generation (RAG) API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject bodies that declare a size above the upload limit before any of the body is read."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"File too large. The maximum upload size is {MAX_UPLOAD_BYTES} bytes."}
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Time each request and report its stages in a `Server-Timing` header.
+
+    Streaming responses only report the stages that finished before the first byte was sent.
+    """
+    started = time.perf_counter()
+    with collect_timings() as timings, span(f"{request.method} {request.url.path}"):
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        elapsed, method=request.method, path=route.path if route else "unmatched", status=response.status_code
+    )
+    content_length = response.headers.get("content-length")
+    record_payload("response", int(content_length) if content_length else None)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+# Longest client-supplied request id that is kept
+MAX_REQUEST_ID_CHARS = 128
+
+@app.middleware("http")
+async def tag_request(request: Request, call_next):
+    """
+    Tag every log record of the request with an id and return it in `X-Request-ID`.
+
+    The id is taken from the request's `X-Request-ID` header, or generated.
+    """
+    request_id = request.headers.get("x-request-id", "")[:MAX_REQUEST_ID_CHARS] or uuid.uuid4().hex
+    with logger.contextualize(request_id=request_id):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Add CORS middleware last so it wraps the middleware above, including early rejections
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Frontend dev server
@@ -40,4 +177,24 @@ async def root():
     Returns:
         dict: A welcome message.
     """
-    return {"message": "Welcome to the RAG Application API!"}
\ No newline at end of file
+    return {"message": "Welcome to the RAG Application API!"}
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the startup warm-up is done, 503 while it runs.
+
+    Returns:
+        dict: Warm-up status, the app import time and the duration of each warm-up step, in seconds.
+    """
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=warmup.report())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint with stage durations, token counts and payload sizes.
+
+    Returns:
+        str: All metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,31 +1,141 @@
+import base64
+import json
 from fastapi import HTTPException
-from app.utils.vector_store import initialize_vector_store
+from app.core.registry import get_vector_store
+from app.utils.async_store import store_reads
+from app.utils.vector_store import get_records_after
 from loguru import logger
 
-def vector_store_check():
+INSPECT_FIELDS = ("documents", "metadatas", "embeddings")
+STATS_PAGE_SIZE = 1000
+
+def encode_cursor(after):
+    """
+    Encode the store position of the last item of a page as an opaque cursor.
+
+    The next page starts after that item, so it neither skips nor repeats items when records
+    are added between pages; see `app.utils.vector_store.get_records_after`.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"after": after}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by `encode_cursor`. An empty cursor starts at the beginning."""
+    if not cursor:
+        return None
     try:
-        logger.info("Starting vector store inspection.")
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def parse_include(include):
+    """Parse a comma-separated projection such as 'documents,metadatas'."""
+    fields = [field.strip() for field in include.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in INSPECT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include fields: {unknown}. Use any of {INSPECT_FIELDS}.")
+    return fields
 
-        # Load the existing vector store
-        vectorstore = initialize_vector_store("chroma")
-        logger.info("Vector store successfully initialized.")
+def parse_where(where):
+    """Parse a JSON metadata filter, e.g. '{"source": "report.pdf"}'."""
+    if not where:
+        return None
+    try:
+        return json.loads(where)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid metadata filter. Provide a JSON object.")
+
+def _format_items(items, include):
+    results = []
+    for index, record_id in enumerate(items["ids"]):
+        result = {"id": record_id}
+        if "documents" in include:
+            result["text"] = items["documents"][index]
+        if "metadatas" in include:
+            result["metadata"] = items["metadatas"][index]
+        if "embeddings" in include:
+            result["embedding"] = [float(value) for value in items["embeddings"][index]]
+        results.append(result)
+    return results
+
+def get_vector_store_page(after=None, limit=100, include=("documents", "metadatas"), where=None, vector_store_type="chroma"):
+    """
+    Read the page after store position `after`, fetching only the requested fields.
 
-        # Access all stored embeddings and associated data
-        items = vectorstore._collection.get(include=["embeddings", "metadatas", "documents"])
-        logger.info("Retrieved items from the vector store.")
+    Returns:
+        tuple[list[dict], int | None]: The formatted items and the position the next page starts after, or None at the end.
+    """
+    vectorstore = get_vector_store(vector_store_type)
+    items, last = get_records_after(vectorstore, after=after, limit=limit, where=where, include=include)
+    return _format_items(items, include), last
 
-        # Format the results for display
-        results = []
-        for text, metadata, embedding in zip(items["documents"], items["metadatas"], items["embeddings"]):
-            results.append({
-                "text": text,
-                "metadata": metadata,
-                # "embedding": embedding.tolist() if isinstance(embedding, np.ndarray) else embedding  # Uncomment if embeddings are needed
-            })
+def vector_store_check(cursor=None, limit=100, include="documents,metadatas", where=None, vector_store_type="chroma"):
+    try:
+        logger.info("Starting vector store inspection.")
+        after = decode_cursor(cursor)
+        fields = parse_include(include)
+
+        # Read one page, without embeddings unless they were asked for
+        results, last = get_vector_store_page(after, limit, fields, parse_where(where), vector_store_type)
+        logger.info("Retrieved {} items from the vector store.", len(results))
 
         logger.info("Vector store inspection completed successfully.")
-        return {"message": "Retrieved vector store contents successfully.", "data": results}
+        return {
+            "message": "Retrieved vector store contents successfully.",
+            "data": results,
+            "next_cursor": encode_cursor(last) if last is not None else None
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An error occurred while inspecting the vector store: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while inspecting the vector store: {str(e)}")
+
+def iter_vector_store(page_size=100, include="documents,metadatas", where=None, vector_store_type="chroma"):
+    """
+    Yield every matching item as one NDJSON line, reading the store one page at a time.
+
+    Each page is read on the store read pool, like the other store reads, so a long stream
+    never holds a thread outside it. Arguments are validated before the first line is produced.
+    """
+    fields = parse_include(include)
+    where = parse_where(where)
+
+    async def lines():
+        after, done = None, False
+        while not done:
+            results, after = await store_reads.run(get_vector_store_page, after, page_size, fields, where, vector_store_type)
+            done = after is None
+            for result in results:
+                yield json.dumps(result) + "\n"
+
+    return lines()
+
+def vector_store_stats(where=None, vector_store_type="chroma"):
+    """
+    Count stored chunks per source, reading metadata only.
+
+    Returns:
+        dict: Total chunk count and the chunk count of each source.
+    """
+    try:
+        vectorstore = get_vector_store(vector_store_type)
+        where = parse_where(where)
+        per_source = {}
+        after, done = None, False
+        while not done:
+            items, after = get_records_after(vectorstore, after=after, limit=STATS_PAGE_SIZE, where=where, include=["metadatas"])
+            done = after is None
+            for metadata in items["metadatas"]:
+                source = (metadata or {}).get("source", "")
+                per_source[source] = per_source.get(source, 0) + 1
+        return {
+            "message": "Computed vector store statistics successfully.",
+            "total": sum(per_source.values()),
+            "sources": per_source
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"An error occurred while computing vector store statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"An error occurred while computing vector store statistics: {str(e)}")
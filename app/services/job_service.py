@@ -0,0 +1,151 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import INGEST_WORKERS, INGEST_JOBS_RETAINED
+from app.services.upload_service import process_document_file
+from app.utils.metrics import collect_timings
+from loguru import logger
+
+class IngestionJob:
+    """Status, progress counters and stage timings of one background ingestion."""
+
+    def __init__(self, filename, vector_store_type, chunking=None):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.vector_store_type = vector_store_type
+        self.chunking = chunking or {}
+        self.path = None
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.pages_parsed = 0
+        self.pages_failed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.chunks_written = 0
+        self.chunks_skipped = 0
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add_embedded(self, count):
+        with self._lock:
+            self.chunks_embedded += count
+
+    def add_written(self, count):
+        with self._lock:
+            self.chunks_written += count
+
+    def add_skipped(self, count):
+        with self._lock:
+            self.chunks_skipped += count
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "filename": self.filename,
+                "vector_store_type": self.vector_store_type,
+                "chunking": self.chunking,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": {
+                    "pages_parsed": self.pages_parsed,
+                    "pages_failed": self.pages_failed,
+                    "chunks_total": self.chunks_total,
+                    "chunks_embedded": self.chunks_embedded,
+                    "chunks_written": self.chunks_written,
+                    "chunks_skipped": self.chunks_skipped,
+                },
+                "timings": {stage: round(seconds, 4) for stage, seconds in dict(self.timings).items()},
+            }
+
+class IngestionJobManager:
+    """
+    Runs document ingestion on a pool of worker threads so uploads never block the event loop.
+
+    Finished jobs are kept for status queries until more than `max_retained` jobs exist,
+    after which the oldest finished jobs are dropped.
+    """
+
+    def __init__(self, max_workers=INGEST_WORKERS, max_retained=INGEST_JOBS_RETAINED):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_retained = max_retained
+
+    def submit(self, path, content_type, filename, vector_store_type, chunking=None):
+        """
+        Queue a saved upload for ingestion. The file at `path` is deleted once the job ends.
+
+        `chunking` holds the `create_text_splitter` arguments of this upload.
+
+        Returns:
+            IngestionJob: The queued job.
+        """
+        job = IngestionJob(filename, vector_store_type, chunking)
+        job.path = path
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict()
+        # The job's log records keep the id of the request that queued it
+        self._executor.submit(contextvars.copy_context().run, self._run, job, content_type)
+        logger.info("Queued ingestion job {} for file: '{}'", job.job_id, filename)
+        return job
+
+    def _run(self, job, content_type):
+        with logger.contextualize(job_id=job.job_id):
+            self._process(job, content_type)
+
+    def _process(self, job, content_type):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            with collect_timings() as job.timings:
+                process_document_file(
+                    job.path, content_type, job.filename, job.vector_store_type, job=job, chunking=job.chunking
+                )
+            job.status = "completed"
+            logger.info("Ingestion job {} completed.", job.job_id)
+        except Exception as e:
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            logger.error("Ingestion job {} failed: {}", job.job_id, str(e))
+        finally:
+            job.finished_at = time.time()
+            os.unlink(job.path)
+
+    def _evict(self):
+        excess = len(self._jobs) - self._max_retained
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self):
+        """Cancel queued jobs and wait for running ones to finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for job in self.list():
+            if job.status == "queued":
+                job.status = "cancelled"
+                os.unlink(job.path)
+
+job_manager = IngestionJobManager()
@@ -1,166 +1,546 @@
+import asyncio
 from fastapi import HTTPException
-from app.utils.vector_store import initialize_vector_store
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import (
+    DOC_QUERY_MAX_CHUNKS,
+    DOC_QUERY_SUMMARY_TOKENS,
+    DOC_SIMILARITY_TOP_K,
+    BATCH_LLM_CONCURRENCY,
+    HYBRID_CANDIDATE_FACTOR,
+    RRF_K,
+)
+from app.core.registry import registry, get_async_vector_store
+from app.utils.chunking import create_text_splitter
+from app.utils.context_builder import assemble_context
+from app.utils.embedding_pipeline import embed_texts
 from app.utils.file_utils import validate_file_type, load_document
+from app.utils.async_store import store_reads
+from app.utils.lexical_index import tokenize, reciprocal_rank_fusion
+from app.utils.llm_gateway import llm_gateway
+from app.utils.metrics import timed, record_tokens, record_payload
+from app.utils.query_cache import query_cache
+from app.utils.tokens import truncate_tokens
 from loguru import logger
-import openai
-from openai import AsyncOpenAI
-import os
+import json
 
-async def perform_document_similarity(file, top_n, vector_store_type, llm_type):
+def _check_llm_type(llm_type):
+    """Raise if `llm_type` is not a supported LLM."""
+    if llm_type == "gpt-4o":
+        return
+    if llm_type == "gemini":
+        logger.error("Google Gemini is not implemented.")
+        raise NotImplementedError("Google Gemini support is not implemented yet.")
+    logger.error("Invalid LLM type specified: {}", llm_type)
+    raise ValueError("Invalid LLM type specified.")
+
+def _build_context(results, model, operation):
+    with timed(operation, "assemble_context"):
+        return assemble_context(results, model)
+
+def _build_messages(query, context):
+    return [
+        {"role": "system", "content": "You are a highly intelligent assistant."},
+        {"role": "user", "content": f"""
+                    Using the provided context, perform the following tasks:
+                    1. Answer the query: "{query}".
+                    2. If the context doesn't contain relevant information, respond with: 'The context does not contain sufficient information to answer the query.'
+
+                    Context:
+                    {context}
+
+                    Your response:
+                    """}
+    ]
+
+def _format_results(results, aggregate_scores=None):
+    formatted = [
+        {
+            "text": item[0].page_content,
+            "metadata": item[0].metadata,
+            "score": item[1]
+        }
+        for item in results
+    ]
+    if aggregate_scores is not None:
+        for item, aggregate_score in zip(formatted, aggregate_scores):
+            item["aggregate_score"] = aggregate_score
+    return formatted
+
+DOCUMENT_SIMILARITY_MODES = ("multi_vector", "single")
+AGGREGATIONS = ("max", "mean", "topk_sum")
+
+def _relevance(distance):
+    """Map a vector store distance to a relevance in (0, 1], higher is closer."""
+    return 1.0 / (1.0 + max(distance, 0.0))
+
+def _aggregate(relevances, aggregation):
+    if aggregation == "max":
+        return max(relevances)
+    if aggregation == "mean":
+        return sum(relevances) / len(relevances)
+    return sum(sorted(relevances, reverse=True)[:DOC_SIMILARITY_TOP_K])
+
+def _sample_evenly(items, limit):
+    """Keep at most `limit` items spread evenly over the list, preserving order."""
+    if len(items) <= limit:
+        return items
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+async def _multi_vector_search(documents, top_n, vector_store_type, aggregation):
+    """
+    Chunk the query document with the ingestion splitter, search with every chunk
+    embedding in one store call, and rank stored chunks by their aggregated relevance.
+
+    Returns:
+        tuple: `(results, aggregate_scores, source_scores)` where `results` holds
+        `(Document, best distance)` pairs for the top `top_n` stored chunks.
+    """
+    def split():
+        return _sample_evenly(create_text_splitter().split_documents(documents), DOC_QUERY_MAX_CHUNKS)
+
+    with timed("document_similarity", "split"):
+        query_chunks = await run_in_threadpool(split)
+    logger.info("Query document split into {} chunks for multi-vector search.", len(query_chunks))
+
+    with timed("document_similarity", "embed"):
+        vectors = await run_in_threadpool(
+            embed_texts, registry.get_embeddings(), [chunk.page_content for chunk in query_chunks]
+        )
+    with timed("document_similarity", "search"):
+        hits_per_chunk = await get_async_vector_store(vector_store_type).search_by_vectors(vectors, top_n)
+
+    matches = {}
+    for hits in hits_per_chunk:
+        for record_id, document, distance in hits:
+            match = matches.setdefault(record_id, {"document": document, "distance": distance, "relevances": []})
+            match["distance"] = min(match["distance"], distance)
+            match["relevances"].append(_relevance(distance))
+
+    source_relevances = {}
+    for match in matches.values():
+        match["score"] = _aggregate(match["relevances"], aggregation)
+        source_relevances.setdefault(match["document"].metadata.get("source", ""), []).extend(match["relevances"])
+    source_scores = sorted(
+        ({"source": source, "score": _aggregate(relevances, aggregation)} for source, relevances in source_relevances.items()),
+        key=lambda item: item["score"],
+        reverse=True
+    )
+
+    ranked = sorted(matches.values(), key=lambda match: match["score"], reverse=True)[:top_n]
+    results = [(match["document"], match["distance"]) for match in ranked]
+    return results, [match["score"] for match in ranked], source_scores
+
+async def _retrieve_for_document(documents, top_n, vector_store_type, mode, aggregation):
+    """
+    Retrieve stored chunks similar to an uploaded document.
+
+    Returns:
+        tuple: `(results, prompt_query, extra)` where `prompt_query` is the text of the
+        document that goes into the LLM prompt and `extra` holds additional response fields.
+    """
+    query = " ".join([doc.page_content for doc in documents])
+    if mode == "single":
+        with timed("document_similarity", "search"):
+            results = await get_async_vector_store(vector_store_type).similarity_search_with_score(query, top_n)
+        return results, query, {}
+    if mode != "multi_vector":
+        raise ValueError(f"Invalid document similarity mode: {mode}. Use one of {DOCUMENT_SIMILARITY_MODES}.")
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Invalid aggregation: {aggregation}. Use one of {AGGREGATIONS}.")
+
+    results, aggregate_scores, source_scores = await _multi_vector_search(documents, top_n, vector_store_type, aggregation)
+    extra = {"aggregation": aggregation, "source_scores": source_scores, "aggregate_scores": aggregate_scores}
+    # Only a bounded prefix of the query document goes into the prompt
+    return results, truncate_tokens(query, DOC_QUERY_SUMMARY_TOKENS), extra
+
+def _sse(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _record_usage(usage, model):
+    if usage is not None:
+        record_tokens("prompt", usage.prompt_tokens, model=model)
+        record_tokens("completion", usage.completion_tokens, model=model)
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# Queries of at most this many words that contain an identifier (digits or inner punctuation)
+KEYWORD_QUERY_MAX_WORDS = 3
+
+def is_keyword_query(query):
+    """Whether `query` looks like an exact-term lookup, e.g. a part number or a clause id."""
+    words = query.split()
+    return 0 < len(words) <= KEYWORD_QUERY_MAX_WORDS and any(
+        any(char.isdigit() for char in token) or any(char in "-_./:" for char in token) for token in tokenize(query)
+    )
+
+async def _vector_hits(query, k, vector_store_type, query_embedding=None):
+    """Embed the query, unless the query cache lookup already did, and search the vector store with it."""
+    if query_embedding is None:
+        with timed("text_similarity", "embed"):
+            query_embedding = await run_in_threadpool(registry.get_embeddings().embed_query, query)
+    with timed("text_similarity", "search"):
+        return (await get_async_vector_store(vector_store_type).search_by_vectors([query_embedding], k))[0]
+
+async def _lexical_hits(query, k, vector_store_type):
+    """Search the BM25 keyword index of the store; no embedding is needed."""
+    with timed("text_similarity", "lexical_search"):
+        return await store_reads.run(lambda: registry.get_lexical_index(vector_store_type).search(query, k))
+
+async def _search_text(query, top_n, vector_store_type, query_embedding=None, search_mode="vector"):
+    """
+    Retrieve the stored chunks that best match the query.
+
+    'vector' searches the vector store with the query embedding, 'lexical' ranks chunks with
+    BM25 on the keyword index and never embeds the query, and 'hybrid' fuses both rankings by
+    reciprocal rank. In hybrid mode a keyword-style query (see `is_keyword_query`) whose terms
+    already match `top_n` chunks is answered from the keyword index alone, skipping the embedding.
+
+    Returns:
+        list[tuple[Document, float]]: The best chunks, best first, with their vector distance
+        ('vector'), BM25 score ('lexical' and hybrid keyword queries) or fused score ('hybrid').
+        Higher is better for BM25 and fused scores.
+    """
+    if search_mode == "vector":
+        hits = await _vector_hits(query, top_n, vector_store_type, query_embedding)
+    elif search_mode == "lexical":
+        hits = await _lexical_hits(query, top_n, vector_store_type)
+    else:
+        depth = top_n * max(1, HYBRID_CANDIDATE_FACTOR)
+        lexical = await _lexical_hits(query, depth, vector_store_type)
+        if query_embedding is None and len(lexical) >= top_n and is_keyword_query(query):
+            logger.info("Keyword query answered from the lexical index without embedding.")
+            hits = lexical[:top_n]
+        else:
+            vector = await _vector_hits(query, depth, vector_store_type, query_embedding)
+            hits = reciprocal_rank_fusion([lexical, vector], RRF_K)[:top_n]
+    return [(document, score) for _, document, score in hits]
+
+async def _complete(query, context, model, operation):
+    logger.info("Calling {} with the prepared context.", model)
+    record_payload("llm_context", len(context.encode("utf-8")))
+    with timed(operation, "llm"):
+        llm_response = await llm_gateway.complete(model, _build_messages(query, context))
+    _record_usage(getattr(llm_response, "usage", None), model)
+    logger.info("{} response received.", model)
+    return llm_response.choices[0].message.content
+
+async def _query_cache_lookup(query, top_n, llm_type, vector_store_type, search_mode="vector"):
+    """
+    Return `(cached response or None, query embedding used for near-duplicate matching, cache generation)`.
+
+    Lexical searches never embed the query, so they only match cached queries exactly. The
+    generation is taken before the lookup and is passed to `query_cache.put` with the response.
+    """
+    generation = query_cache.generation(vector_store_type)
+    query_embedding = None
+    if query_cache.near_duplicates_enabled and search_mode != "lexical":
+        with timed("text_similarity", "embed"):
+            query_embedding = await run_in_threadpool(registry.get_embeddings().embed_query, query)
+    with timed("text_similarity", "cache_lookup"):
+        cached = query_cache.get(
+            query, top_n, llm_type, vector_store_type, embedding=query_embedding, search_mode=search_mode
+        )
+    return cached, query_embedding, generation
+
+async def _replay_cached(response):
+    """Replay a cached response as the same SSE events a live stream produces."""
+    yield _sse("documents", {"retrieved_documents": response.get("retrieved_documents", [])})
+    if response.get("llm_response"):
+        yield _sse("token", {"content": response["llm_response"]})
+    yield _sse("done", {"message": response["message"]})
+
+async def _stream_similarity(retrieved, model, label, operation, cache_params=None):
+    """
+    Yield the retrieved documents as one SSE event, then the LLM answer token by token.
+
+    `retrieved` holds `(results, prompt_query, extra)`; retrieval runs before the stream starts,
+    so a saturated vector store still fails the request with 429 or 503. Stage timings are recorded under `operation`.
+    Events: `documents`, then any number of `token`, then `done`. Failures are reported
+    as an `error` event because the response status has already been sent.
+    When `cache_params` holds the query cache arguments, the completed response is cached.
+    """
+    try:
+        results, query, extra = retrieved
+        logger.info("Similarity search completed. Retrieved {} results.", len(results))
+        formatted_results = _format_results(results, extra.pop("aggregate_scores", None))
+        yield _sse("documents", {"retrieved_documents": formatted_results, **extra})
+
+        context = _build_context(results, model, operation)
+        if not context:
+            logger.warning("No relevant documents found in similarity search.")
+            yield _sse("done", {"message": "No relevant documents found."})
+            return
+
+        logger.info("Streaming {} response for the prepared context.", model)
+        record_payload("llm_context", len(context.encode("utf-8")))
+        tokens = []
+        with timed(operation, "llm"):
+            async for chunk in llm_gateway.stream(model, _build_messages(query, context)):
+                # The final chunk has no choices and carries the token usage
+                _record_usage(getattr(chunk, "usage", None), model)
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    tokens.append(content)
+                    yield _sse("token", {"content": content})
+        logger.info("{} process completed successfully.", label)
+        message = f"{label} process completed successfully."
+        if cache_params is not None:
+            query_embedding, cache_args, search_mode, generation = cache_params
+            response = {"message": message, "retrieved_documents": formatted_results, "llm_response": "".join(tokens)}
+            query_cache.put(*cache_args, response, embedding=query_embedding, search_mode=search_mode, generation=generation)
+        yield _sse("done", {"message": message})
+
+    except Exception as e:
+        logger.error("An error occurred during streamed {}: {}", label.lower(), str(e))
+        yield _sse("error", {"detail": f"An error occurred during {label.lower()}: {str(e)}"})
+
+async def perform_document_similarity(file, top_n, vector_store_type, llm_type, mode="multi_vector", aggregation="max"):
     try:
         logger.info("Starting document similarity process with LLM: {}, Vector Store: {}", llm_type, vector_store_type)
 
         # Step 1: Validate and process the document file
         logger.info("Processing file: '{}'", file.filename)
         validate_file_type(file)
-        documents = load_document(file)
-
-        # Combine all document content into a single query
-        query = " ".join([doc.page_content for doc in documents])
-        logger.info("File processed successfully, query generated from file content.")
+        record_payload("upload", file.size)
+        with timed("document_similarity", "parse"):
+            documents = await run_in_threadpool(load_document, file)
+        logger.info("File processed successfully.")
 
-        # Step 2: Initialize the vector store
-        vectorstore = initialize_vector_store(vector_store_type)
-        logger.info("Vector store initialized successfully.")
-
-        # Step 3: Perform similarity search
-        logger.info("Performing similarity search with top_n: {}", top_n)
-        results = vectorstore.similarity_search_with_score(query, k=top_n)
+        # Step 2-3: Perform similarity search with the document content
+        logger.info("Performing {} similarity search with top_n: {}", mode, top_n)
+        results, query, extra = await _retrieve_for_document(documents, top_n, vector_store_type, mode, aggregation)
         logger.info("Similarity search completed. Retrieved {} results.", len(results))
 
-        # Step 4: Prepare context for LLM
-        context = "\n\n".join(
-            [f"Source: {item[0].metadata.get('source', '')}, Page: {item[0].metadata.get('page', '')}\n{item[0].page_content}"
-             for item in results]
-        )
+        # Step 4: Prepare context for LLM within the model's token budget
+        context = _build_context(results, "gpt-4o", "document_similarity")
         if not context:
             logger.warning("No relevant documents found in similarity search.")
             return {"message": "No relevant documents found.", "data": []}
         logger.info("Context prepared for LLM.")
 
-        # Step 5: Initialize and call LLM
+        # Step 5: Call LLM
         logger.info("Initializing LLM: {}", llm_type)
-        if llm_type == "gpt-4o":
-            client = AsyncOpenAI()
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-            logger.info("Calling GPT-4 with the prepared context.")
-            llm_response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a highly intelligent assistant."},
-                    {"role": "user", "content": f"""
-                    Using the provided context, perform the following tasks:
-                    1. Answer the query: "{query}".
-                    2. If the context doesn't contain relevant information, respond with: 'The context does not contain sufficient information to answer the query.'
-
-                    Context:
-                    {context}
-
-                    Your response:
-                    """}
-                ]
-            )
-            llm_response_content = llm_response.choices[0].message.content
-            logger.info("GPT-4 response received.")
-        elif llm_type == "gemini":
-            logger.error("Google Gemini is not implemented.")
-            raise NotImplementedError("Google Gemini support is not implemented yet.")
-        else:
-            logger.error("Invalid LLM type specified: {}", llm_type)
-            raise ValueError("Invalid LLM type specified.")
+        _check_llm_type(llm_type)
+        llm_response_content = await _complete(query, context, model="gpt-4o", operation="document_similarity")
 
         # Step 6: Format response
-        formatted_results = [
-            {
-                "text": item[0].page_content,
-                "metadata": item[0].metadata,
-                "score": item[1]
-            }
-            for item in results
-        ]
+        formatted_results = _format_results(results, extra.pop("aggregate_scores", None))
         logger.info("Document similarity process completed successfully.")
 
         return {
             "message": "Document similarity process completed successfully.",
             "retrieved_documents": formatted_results,
-            "llm_response": llm_response_content
+            "llm_response": llm_response_content,
+            **extra
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("An error occurred during document similarity: {}", str(e))
         raise HTTPException(status_code=500, detail=f"An error occurred during document similarity: {str(e)}")
 
-async def perform_text_similarity(query, top_n, llm_type, vector_store_type):
+async def perform_text_similarity(query, top_n, llm_type, vector_store_type, search_mode="vector"):
     try:
-        logger.info("Starting text similarity process with LLM: {}, Vector Store: {}", llm_type, vector_store_type)
-        
-        # Step 1: Initialize the vector store
-        vectorstore = initialize_vector_store(vector_store_type)
-        logger.info("Vector store initialized successfully.")
-
-        # Step 2: Perform similarity search
-        logger.info("Performing similarity search for query: {}", query)
-        results = vectorstore.similarity_search_with_score(query, k=top_n)
+        logger.info("Starting text similarity process with LLM: {}, Vector Store: {}, Search: {}",
+                    llm_type, vector_store_type, search_mode)
+
+        # Step 0: Serve repeated questions from the query cache
+        cached, query_embedding, generation = await _query_cache_lookup(query, top_n, llm_type, vector_store_type, search_mode)
+        if cached is not None:
+            logger.info("Query cache hit, returning cached response.")
+            return cached
+
+        # Step 1-2: Search the vector store, the keyword index or both
+        logger.info("Performing {} search for query: {}", search_mode, query)
+        results = await _search_text(query, top_n, vector_store_type, query_embedding, search_mode)
         logger.info("Similarity search completed. Retrieved {} results.", len(results))
 
-        # Step 3: Prepare context for LLM
-        context = "\n\n".join(
-            [f"Source: {item[0].metadata.get('source', '')}, Page: {item[0].metadata.get('page', '')}\n{item[0].page_content}"
-             for item in results]
-        )
+        # Step 3: Prepare context for LLM within the model's token budget
+        context = _build_context(results, "gpt-4", "text_similarity")
         if not context:
             logger.warning("No relevant documents found in similarity search.")
             return {"message": "No relevant documents found.", "data": []}
         logger.info("Context prepared for LLM.")
 
-        # Step 4: Initialize and call LLM
+        # Step 4: Call LLM
         logger.info("Initializing LLM: {}", llm_type)
-        if llm_type == "gpt-4o":
-            client = AsyncOpenAI()
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-            logger.info("Calling GPT-4 with the prepared context.")
-            llm_response = await client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a highly intelligent assistant."},
-                    {"role": "user", "content": f"""
-                    Using the provided context, perform the following tasks:
-                    1. Answer the query: "{query}".
-                    2. If the context doesn't contain relevant information, respond with: 'The context does not contain sufficient information to answer the query.'
-
-                    Context:
-                    {context}
-
-                    Your response:
-                    """}
-                ]
-            )
-            llm_response_content = llm_response.choices[0].message.content
-            logger.info("GPT-4 response received.")
-        elif llm_type == "gemini":
-            logger.error("Google Gemini is not implemented.")
-            raise NotImplementedError("Google Gemini support is not implemented yet.")
-        else:
-            logger.error("Invalid LLM type specified: {}", llm_type)
-            raise ValueError("Invalid LLM type specified.")
+        _check_llm_type(llm_type)
+        llm_response_content = await _complete(query, context, model="gpt-4", operation="text_similarity")
 
         # Step 5: Format response
-        formatted_results = [
-            {
-                "text": item[0].page_content,
-                "metadata": item[0].metadata,
-                "score": item[1]
-            }
-            for item in results
-        ]
+        formatted_results = _format_results(results)
         logger.info("Text similarity process completed successfully.")
 
-        return {
+        response = {
             "message": "Text similarity process completed successfully.",
             "retrieved_documents": formatted_results,
             "llm_response": llm_response_content
         }
+        query_cache.put(
+            query, top_n, llm_type, vector_store_type, response, embedding=query_embedding, search_mode=search_mode,
+            generation=generation
+        )
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("An error occurred during text similarity: {}", str(e))
-        raise HTTPException(status_code=500, detail=f"An error occurred during text similarity: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred during text similarity: {str(e)}")
+
+async def stream_text_similarity(query, top_n, llm_type, vector_store_type, search_mode="vector"):
+    """
+    Streaming variant of `perform_text_similarity`.
+
+    Returns:
+        AsyncIterator[str]: Server-Sent Events, see `_stream_similarity`.
+    """
+    logger.info("Starting streamed text similarity with LLM: {}, Vector Store: {}, Search: {}",
+                llm_type, vector_store_type, search_mode)
+    _check_llm_type(llm_type)
+    cached, query_embedding, generation = await _query_cache_lookup(query, top_n, llm_type, vector_store_type, search_mode)
+    if cached is not None:
+        logger.info("Query cache hit, replaying cached response.")
+        return _replay_cached(cached)
+    cache_params = (query_embedding, (query, top_n, llm_type, vector_store_type), search_mode, generation)
+    retrieved = await _search_text(query, top_n, vector_store_type, query_embedding, search_mode), query, {}
+    return _stream_similarity(
+        retrieved, model="gpt-4", label="Text similarity", operation="text_similarity", cache_params=cache_params
+    )
+
+async def stream_document_similarity(file, top_n, vector_store_type, llm_type, mode="multi_vector", aggregation="max"):
+    """
+    Streaming variant of `perform_document_similarity`.
+
+    The file is read before streaming starts because the upload is closed once the endpoint returns.
+
+    Returns:
+        AsyncIterator[str]: Server-Sent Events, see `_stream_similarity`.
+    """
+    logger.info("Starting streamed document similarity with LLM: {}, Vector Store: {}", llm_type, vector_store_type)
+    _check_llm_type(llm_type)
+    validate_file_type(file)
+    record_payload("upload", file.size)
+    with timed("document_similarity", "parse"):
+        documents = await run_in_threadpool(load_document, file)
+    retrieved = await _retrieve_for_document(documents, top_n, vector_store_type, mode, aggregation)
+    return _stream_similarity(retrieved, model="gpt-4o", label="Document similarity", operation="document_similarity")
+
+async def _retrieve_batch(queries, top_n, llm_type, vector_store_type, use_cache):
+    """
+    Embed all queries in batched calls, check the query cache and search for every miss in one store call.
+
+    Returns:
+        tuple: `(vectors, cached, results, generation)` with one entry per query in the first three;
+        `cached` holds the cached response or None, `results` the retrieved `(Document, distance)`
+        pairs of each miss, and `generation` the query cache generation to store new answers with.
+    """
+    generation = query_cache.generation(vector_store_type)
+    with timed("text_similarity_batch", "embed"):
+        vectors = await run_in_threadpool(embed_texts, registry.get_embeddings(), queries)
+    cached = [None] * len(queries)
+    if use_cache:
+        with timed("text_similarity_batch", "cache_lookup"):
+            cached = [
+                query_cache.get(query, top_n, llm_type, vector_store_type, embedding=vector)
+                for query, vector in zip(queries, vectors)
+            ]
+    misses = [index for index, response in enumerate(cached) if response is None]
+    results = [None] * len(queries)
+    with timed("text_similarity_batch", "search"):
+        store = get_async_vector_store(vector_store_type)
+        hits_per_query = await store.search_by_vectors([vectors[i] for i in misses], top_n)
+    for index, hits in zip(misses, hits_per_query):
+        results[index] = [(document, distance) for _, document, distance in hits]
+    return vectors, cached, results, generation
+
+async def _start_batch(queries, top_n, llm_type, vector_store_type, retrieval_only):
+    """
+    Retrieve for every query, then start one task per query that produces its result item.
+
+    LLM calls run concurrently, at most `BATCH_LLM_CONCURRENCY` at a time. A failed LLM call
+    is reported in the item's `error` field instead of failing the batch.
+
+    Returns:
+        list[asyncio.Task]: One task per query, in query order.
+    """
+    if not retrieval_only:
+        _check_llm_type(llm_type)
+    vectors, cached, results, generation = await _retrieve_batch(queries, top_n, llm_type, vector_store_type, not retrieval_only)
+    logger.info("Batch retrieval completed for {} queries, {} served from the query cache.",
+                len(queries), sum(response is not None for response in cached))
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def answer(index):
+        query = queries[index]
+        if cached[index] is not None:
+            return {"index": index, "query": query, "cached": True, **cached[index]}
+        item = {"index": index, "query": query, "cached": False}
+        formatted_results = _format_results(results[index])
+        if retrieval_only:
+            return {**item, "message": "Retrieval completed successfully.", "retrieved_documents": formatted_results}
+        context = _build_context(results[index], "gpt-4", "text_similarity_batch")
+        if not context:
+            return {**item, "message": "No relevant documents found.", "retrieved_documents": []}
+        try:
+            async with semaphore:
+                llm_response_content = await _complete(query, context, model="gpt-4", operation="text_similarity_batch")
+        except Exception as e:
+            logger.error("LLM call failed for batch query {}: {}", index, str(e))
+            return {**item, "message": "The LLM call failed.", "retrieved_documents": formatted_results, "error": str(e)}
+        response = {
+            "message": "Text similarity process completed successfully.",
+            "retrieved_documents": formatted_results,
+            "llm_response": llm_response_content
+        }
+        query_cache.put(query, top_n, llm_type, vector_store_type, response, embedding=vectors[index], generation=generation)
+        return {**item, **response}
+
+    return [asyncio.ensure_future(answer(index)) for index in range(len(queries))]
+
+async def perform_text_similarity_batch(queries, top_n, llm_type, vector_store_type, retrieval_only=False):
+    """
+    Answer many text queries in one call.
+
+    Queries are embedded in batched calls and searched in one vectorized store call; LLM
+    calls run concurrently, or are skipped when `retrieval_only` is set.
+
+    Returns:
+        dict: Response message and one result item per query, in query order.
+    """
+    try:
+        logger.info("Starting batch text similarity for {} queries with LLM: {}, Vector Store: {}",
+                    len(queries), "none" if retrieval_only else llm_type, vector_store_type)
+        tasks = await _start_batch(queries, top_n, llm_type, vector_store_type, retrieval_only)
+        items = await asyncio.gather(*tasks)
+        logger.info("Batch text similarity completed for {} queries.", len(items))
+        return {"message": "Batch text similarity completed successfully.", "results": items}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("An error occurred during batch text similarity: {}", str(e))
+        raise HTTPException(status_code=500, detail=f"An error occurred during batch text similarity: {str(e)}")
+
+async def stream_text_similarity_batch(queries, top_n, llm_type, vector_store_type, retrieval_only=False):
+    """
+    Streaming variant of `perform_text_similarity_batch`.
+
+    Retrieval finishes before this returns, so retrieval errors still fail the request.
+
+    Returns:
+        AsyncIterator[str]: One NDJSON line per query, in query order, each sent as soon as it and all earlier ones are done.
+    """
+    logger.info("Starting streamed batch text similarity for {} queries.", len(queries))
+    tasks = await _start_batch(queries, top_n, llm_type, vector_store_type, retrieval_only)
+
+    async def lines():
+        try:
+            for task in tasks:
+                yield json.dumps(await task) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return lines()
@@ -1,11 +1,105 @@
-import shutil
-from app.utils.file_utils import validate_file_type, load_document
-from app.utils.vector_store import initialize_vector_store, get_chroma_db_file
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os
+from app.utils.file_utils import validate_file_type, save_upload, iter_document_pages
+from app.utils.snapshot import snapshot_manager
+from app.utils.replication import version_publisher
+from app.core.registry import registry, get_vector_store
+from app.utils.embedding_pipeline import EmbeddingPipeline
+from app.utils.query_cache import query_cache
+from app.utils.chunking import create_text_splitter, CHUNK_METADATA_KEYS
+from app.utils.metrics import timed
 from fastapi import HTTPException
 from loguru import logger
 
-def process_and_upload_document(file, vector_store_type):
+_END = object()
+
+def _timed_iter(iterable, operation, stage):
+    """Yield from `iterable`, timing the production of each item as `stage`."""
+    iterator = iter(iterable)
+    while True:
+        with timed(operation, stage):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+def process_document_file(path, content_type, filename, vector_store_type, job=None, chunking=None):
+    """
+    Parse, chunk, embed and store a document that has already been saved to disk.
+
+    Pages are parsed lazily and flow straight into splitting and embedding, so only
+    the batches in flight are held in memory, however large the file is.
+
+    Args:
+        path (str): Path of the saved upload.
+        content_type (str): MIME type of the upload.
+        filename (str): Original file name, stored as the chunk source.
+        vector_store_type (str): The type of vector store to use.
+        job (IngestionJob, optional): Job whose progress counters are updated.
+        chunking (dict, optional): `create_text_splitter` arguments; omitted ones use the defaults.
+
+    Returns:
+        dict: Response message with the number of chunks processed.
+    """
+    # Step 2: Get the shared vector store
+    logger.info("Getting shared vector store.")
+    vectorstore = get_vector_store(vector_store_type)
+    logger.info("Vector store ready.")
+
+    # Step 3: Parse pages lazily and split each one as it arrives
+    text_splitter = create_text_splitter(**(chunking or {}))
+    logger.info("Parsing '{}' page by page, splitting with {}.", filename, text_splitter.params)
+    counts = {"pages": 0, "pages_failed": 0, "chunks": 0}
+
+    def iter_chunks():
+        for page in _timed_iter(iter_document_pages(path, content_type, filename), "upload", "parse"):
+            counts["pages"] += 1
+            counts["pages_failed"] += 1 if page.metadata.get("parse_error") else 0
+            if job:
+                job.pages_parsed = counts["pages"]
+                job.pages_failed = counts["pages_failed"]
+            with timed("upload", "split"):
+                page_chunks = text_splitter.split_documents([page])
+            counts["chunks"] += len(page_chunks)
+            if job:
+                job.chunks_total = counts["chunks"]
+            for chunk in page_chunks:
+                chunk.metadata = {
+                    "source": chunk.metadata.get("source", ""),
+                    "page": chunk.metadata.get("page", 0),
+                    **{key: chunk.metadata[key] for key in CHUNK_METADATA_KEYS if key in chunk.metadata}
+                }
+                yield chunk
+
+    # Step 4: Embed chunks in concurrent batches and add them to the vector store in bulk
+    logger.info("Adding chunks to the vector store.")
+    pipeline = EmbeddingPipeline(
+        vectorstore, registry.get_embeddings(), lexical_index=registry.get_lexical_index(vector_store_type)
+    )
+    with timed("upload", "embed_store"):
+        written = pipeline.run(
+            iter_chunks(),
+            on_embedded=job.add_embedded if job else None,
+            on_written=job.add_written if job else None,
+            on_skipped=job.add_skipped if job else None
+        )
+    logger.info("{} pages split into {} chunks, added to vector store and persisted successfully.", counts["pages"], counts["chunks"])
+    if written:
+        query_cache.invalidate(vector_store_type)
+
+    # Step 5: Let the background snapshot and publisher threads know the store changed
+    if vector_store_type == "chroma":
+        snapshot_manager.record_writes(written)
+    version_publisher.record_writes(written)
+
+    return {
+        "message": "Document uploaded and processed successfully.",
+        "pages_failed": counts["pages_failed"],
+        "chunks": counts["chunks"],
+        "chunks_written": written,
+        "chunks_skipped": counts["chunks"] - written
+    }
+
+def process_and_upload_document(file, vector_store_type, chunking=None):
     try:
         logger.info("Starting document upload and processing with vector store type: '{}'", vector_store_type)
 
@@ -14,38 +108,14 @@ def process_and_upload_document(file, vector_store_type):
         validate_file_type(file)
         logger.info("File type validated successfully.")
 
-        # Step 2: Load document content
-        logger.info("Loading document content from file: '{}'", file.filename)
-        documents = load_document(file)
-        logger.info("Document loaded successfully. {} documents found.", len(documents))
-
-        # Step 3: Initialize the vector store
-        logger.info("Initializing vector store.")
-        vectorstore = initialize_vector_store(vector_store_type)
-        logger.info("Vector store initialized successfully.")
-
-        # Step 4: Chunk the document
-        logger.info("Splitting documents into chunks with chunk_size=28000 and chunk_overlap=1000.")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=28000, chunk_overlap=1000)
-        chunks = text_splitter.split_documents(documents)
-        logger.info("Document split into {} chunks.", len(chunks))
-
-        # Step 5: Add chunks to the vector store
-        logger.info("Adding chunks to the vector store.")
-        for chunk in chunks:
-            metadata = {"source": chunk.metadata.get("source", ""), "page": chunk.metadata.get("page", 0)}
-            vectorstore.add_texts([chunk.page_content], [metadata])
-        # vectorstore.persist()
-        logger.info("Chunks added to vector store and persisted successfully.")
-
-        # Step 6: Create a backup
-        logger.info("Creating backup of the vector store.")
-        backup_path = get_chroma_db_file().replace("database", "backup")
-        shutil.copy(get_chroma_db_file(), backup_path)
-        logger.info("Backup created successfully at: {}", backup_path)
-
-        return {"message": "Document uploaded and processed successfully.", "chunks": len(chunks)}
+        temp_file_path = save_upload(file)
+        try:
+            return process_document_file(temp_file_path, file.content_type, file.filename, vector_store_type, chunking=chunking)
+        finally:
+            os.unlink(temp_file_path)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("An error occurred during document upload and processing: {}", str(e))
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.core.config import (
+    APP_ROLE,
+    STORE_READ_WORKERS,
+    STORE_READ_MAX_QUEUE,
+    STORE_WRITE_WORKERS,
+    STORE_WRITE_MAX_QUEUE,
+    STORE_QUEUE_TIMEOUT_SECONDS,
+)
+from app.utils.metrics import metrics
+from app.utils.vector_store import search_by_vectors, add_embeddings, get_existing_ids, get_records
+from loguru import logger
+
+STORE_QUEUE_SECONDS = metrics.histogram("rag_store_queue_seconds", "Time vector store calls waited for a pool thread.")
+STORE_REJECTED = metrics.counter("rag_store_rejected_total", "Vector store calls rejected because a pool was saturated.")
+
+class StorePool:
+    """
+    Bounded thread pool for blocking vector store calls.
+
+    At most `workers` calls run at once and at most `max_queue` more wait for a thread. Calls
+    from request handlers beyond that are rejected with 429 right away, and a call that waited
+    longer than `queue_timeout` seconds fails with 503 without touching the store, so overload
+    shows up as fast errors instead of ever longer latency. Background ingestion calls the
+    pool with `call`, which is never rejected; it is already bounded by the ingestion workers.
+    """
+
+    def __init__(self, name, workers, max_queue, queue_timeout=STORE_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """Calls running or waiting on this pool."""
+        return self._pending
+
+    def _release(self, _):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, fn, args, admit):
+        with self._lock:
+            if admit and self._pending >= self.workers + self.max_queue:
+                STORE_REJECTED.inc(pool=self.name, reason="queue_full")
+                logger.warning("Vector store {} pool saturated with {} calls, rejecting.", self.name, self._pending)
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"The vector store is busy ({self.name} queue full). Retry shortly.",
+                    headers={"Retry-After": "1"}
+                )
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"store-{self.name}")
+            self._pending += 1
+            executor = self._executor
+        submitted = time.perf_counter()
+        # Keep the request context so stages timed inside the call reach its Server-Timing header
+        context = contextvars.copy_context()
+
+        def run():
+            waited = time.perf_counter() - submitted
+            STORE_QUEUE_SECONDS.observe(waited, pool=self.name)
+            if admit and self.queue_timeout and waited > self.queue_timeout:
+                STORE_REJECTED.inc(pool=self.name, reason="queue_timeout")
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"The vector store is overloaded ({self.name} call waited {waited:.1f}s). Retry later.",
+                    headers={"Retry-After": "5"}
+                )
+            return context.run(fn, *args)
+
+        future = executor.submit(run)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        """
+        Run `fn(*args)` on the pool and await its result.
+
+        Raises:
+            HTTPException: 429 if the pool queue is full, 503 if the call waited too long.
+        """
+        return await asyncio.wrap_future(self._submit(fn, args, admit=True))
+
+    def call(self, fn, *args):
+        """Run `fn(*args)` on the pool from a worker thread and wait for it, without admission limits."""
+        return self._submit(fn, args, admit=False).result()
+
+    def shutdown(self):
+        """Finish the running calls and stop the threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+store_reads = StorePool("read", STORE_READ_WORKERS, STORE_READ_MAX_QUEUE)
+# A publishing writer runs store writes one at a time, so holding the pool for a call means no
+# write is in progress while a version's snapshot point is taken
+store_writes = StorePool("write", 1 if APP_ROLE == "writer" else STORE_WRITE_WORKERS, STORE_WRITE_MAX_QUEUE)
+
+class AsyncVectorStore:
+    """
+    Awaitable view of a vector store returned by `initialize_vector_store`.
+
+    Searches and record reads run on the read pool, writes on the write pool, so request
+    handlers never block the event loop on a store call and a burst of searches cannot
+    starve ingestion writes, or the other way round.
+    """
+
+    def __init__(self, vectorstore, reads=store_reads, writes=store_writes):
+        self.vectorstore = vectorstore
+        self.reads = reads
+        self.writes = writes
+
+    async def search_by_vectors(self, vectors, k):
+        """See `app.utils.vector_store.search_by_vectors`."""
+        return await self.reads.run(search_by_vectors, self.vectorstore, vectors, k)
+
+    async def similarity_search_with_score(self, query, k):
+        """Embed `query` and search with it, see the store's `similarity_search_with_score`."""
+        return await self.reads.run(lambda: self.vectorstore.similarity_search_with_score(query, k=k))
+
+    async def get_records(self, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+        """See `app.utils.vector_store.get_records`."""
+        return await self.reads.run(lambda: get_records(self.vectorstore, limit, offset, where, include))
+
+    async def get_existing_ids(self, ids):
+        """See `app.utils.vector_store.get_existing_ids`."""
+        return await self.reads.run(get_existing_ids, self.vectorstore, ids)
+
+    async def add_embeddings(self, texts, vectors, metadatas, ids=None):
+        """See `app.utils.vector_store.add_embeddings`."""
+        return await self.writes.run(add_embeddings, self.vectorstore, texts, vectors, metadatas, ids)
+
+def shutdown_store_pools():
+    """Stop the read and write pools once no more store calls are made."""
+    store_reads.shutdown()
+    store_writes.shutdown()
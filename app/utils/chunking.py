@@ -0,0 +1,174 @@
+import re
+from fastapi import HTTPException
+from langchain_core.documents import Document
+from app.core.config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_STRATEGY
+from app.utils.tokens import count_tokens
+
+CHUNK_STRATEGIES = ("structure", "recursive")
+MIN_CHUNK_TOKENS = 32
+# Input limit of the OpenAI embedding models
+MAX_CHUNK_TOKENS = 8191
+
+# Chunk metadata kept in the vector store next to source and page
+CHUNK_METADATA_KEYS = ("heading", "start_index", "chunk_strategy", "chunk_max_tokens", "chunk_overlap_tokens")
+
+# Paragraph, line, sentence and word boundaries, tried in that order
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# Markdown headings, numbered headings ("2.1 Results", "IV. Methods") and short all-caps lines
+HEADING_PATTERN = re.compile(
+    r"^(?:#{1,6}\s+\S.{0,100}"
+    r"|(?:\d+(?:\.\d+)*\.?|[IVXLC]+\.)\s+[A-Z][^.]{0,80}"
+    r"|[A-Z][A-Z0-9 ,:&()/-]{2,80})$"
+)
+
+class TokenChunker:
+    """
+    Splits documents into chunks of at most `max_tokens` tokens.
+
+    Chunks never cross document boundaries, so with one document per page they never cross
+    pages. With the 'structure' strategy, text is first cut into sections at heading lines and
+    neighbouring sections are merged while they fit the budget; sections that are too large are
+    split at paragraph, line, sentence and word boundaries with `overlap_tokens` of overlap.
+    The 'recursive' strategy skips the heading step. Every chunk records the section heading, its
+    character offset in the document (`start_index`, -1 if unknown) and the chunking parameters
+    in its metadata.
+    """
+
+    def __init__(self, max_tokens, overlap_tokens, strategy):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.strategy = strategy
+        self._splitter = self._recursive_splitter(max_tokens)
+
+    def _recursive_splitter(self, max_tokens):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=max_tokens,
+            chunk_overlap=self.overlap_tokens,
+            length_function=count_tokens,
+            separators=SEPARATORS,
+            keep_separator="end"
+        )
+
+    @property
+    def arguments(self):
+        """`create_text_splitter` arguments that recreate this chunker."""
+        return {"max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens, "strategy": self.strategy}
+
+    @property
+    def params(self):
+        """Chunking parameters as stored in chunk metadata."""
+        return {
+            "chunk_strategy": self.strategy,
+            "chunk_max_tokens": self.max_tokens,
+            "chunk_overlap_tokens": self.overlap_tokens,
+        }
+
+    def _sections(self, text):
+        """Cut `text` at heading lines into `(heading, header lines, body, tokens)` sections."""
+        sections = []
+        heading, header, body = "", [], []
+
+        def close():
+            section = "\n".join(header + body)
+            if section.strip():
+                sections.append((heading, "\n".join(header), "\n".join(body), count_tokens(section)))
+
+        for line in text.split("\n"):
+            stripped = line.strip()
+            if stripped and HEADING_PATTERN.match(stripped):
+                if body:
+                    close()
+                    header, body = [], []
+                # Of consecutive headings, the last (most specific) one names the section
+                heading = stripped.lstrip("#").strip()
+                header.append(line)
+            elif body or stripped:
+                body.append(line)
+        close()
+        return sections
+
+    def _merged_sections(self, text):
+        """Merge neighbouring sections while they fit in one chunk, keeping the first heading."""
+        merged = []
+        for heading, header, body, tokens in self._sections(text):
+            if merged and merged[-1][3] + tokens <= self.max_tokens:
+                previous_heading, previous_header, previous_body, previous_tokens = merged[-1]
+                previous = "\n".join(part for part in (previous_header, previous_body) if part)
+                merged[-1] = (previous_heading or heading, "", previous + "\n" + "\n".join(
+                    part for part in (header, body) if part), previous_tokens + tokens)
+            else:
+                merged.append((heading, header, body, tokens))
+        return merged
+
+    def _split_section(self, header, body):
+        """Split a section larger than the budget, repeating its heading lines at the top of every chunk."""
+        budget = self.max_tokens - count_tokens(header) - 1
+        if not header or budget <= self.overlap_tokens:
+            return self._splitter.split_text("\n".join(part for part in (header, body) if part))
+        return [f"{header}\n{chunk}" for chunk in self._recursive_splitter(budget).split_text(body)]
+
+    def split_text(self, text):
+        """
+        Split one text.
+
+        Returns:
+            list[tuple[str, str]]: `(heading, chunk text)` pairs, in text order.
+        """
+        if self.strategy == "recursive":
+            return [("", chunk) for chunk in self._splitter.split_text(text)]
+        chunks = []
+        for heading, header, body, tokens in self._merged_sections(text):
+            if tokens <= self.max_tokens:
+                chunks.append((heading, "\n".join(part for part in (header, body) if part).strip()))
+            else:
+                chunks.extend((heading, chunk) for chunk in self._split_section(header, body))
+        return chunks
+
+    @staticmethod
+    def _find(text, chunk, offset):
+        """Offset of `chunk` in `text` at or after `offset`, ignoring a repeated heading line; -1 if not found."""
+        index = text.find(chunk, offset)
+        if index == -1:
+            body = chunk.partition("\n")[2] or chunk
+            index = text.find(body[:100], offset)
+        return index
+
+    def split_documents(self, documents):
+        """Split documents into chunk documents that keep the original metadata."""
+        chunks = []
+        for document in documents:
+            offset = 0
+            for heading, text in self.split_text(document.page_content):
+                if not text.strip():
+                    continue
+                start_index = self._find(document.page_content, text, offset)
+                if start_index != -1:
+                    # Consecutive chunks may overlap, so the next one can start before this one ends
+                    offset = start_index + 1
+                chunks.append(Document(
+                    page_content=text,
+                    metadata={**document.metadata, **self.params, "heading": heading, "start_index": start_index}
+                ))
+        return chunks
+
+def create_text_splitter(max_tokens=None, overlap_tokens=None, strategy=None):
+    """
+    Create the chunker used to split documents for the vector store.
+
+    Omitted settings fall back to CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS and CHUNK_STRATEGY.
+
+    Raises:
+        HTTPException: 400 if the settings are invalid.
+    """
+    max_tokens = CHUNK_MAX_TOKENS if max_tokens is None else max_tokens
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    strategy = strategy or CHUNK_STRATEGY
+    if strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Invalid chunk strategy: {strategy}. Use one of {CHUNK_STRATEGIES}.")
+    if not MIN_CHUNK_TOKENS <= max_tokens <= MAX_CHUNK_TOKENS:
+        raise HTTPException(status_code=400, detail=f"Chunk size must be between {MIN_CHUNK_TOKENS} and {MAX_CHUNK_TOKENS} tokens.")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise HTTPException(status_code=400, detail="Chunk overlap must be at least 0 and smaller than the chunk size.")
+    return TokenChunker(max_tokens, overlap_tokens, strategy)
@@ -0,0 +1,120 @@
+from app.core.config import CONTEXT_MAX_TOKENS, CONTEXT_MAX_TOKENS_BY_MODEL
+from app.utils.tokens import count_tokens, truncate_tokens
+from loguru import logger
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+# A block is only cut to fit the remaining budget if at least this many tokens of it fit
+MIN_TRUNCATED_TOKENS = 64
+
+def context_budget(model):
+    """Token budget of the retrieved context for `model`."""
+    return CONTEXT_MAX_TOKENS_BY_MODEL.get(model, CONTEXT_MAX_TOKENS)
+
+def _overlap(first, second):
+    """Length of the longest suffix of `first` that is also a prefix of `second`, if long enough."""
+    if len(second) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = second[:MIN_OVERLAP_CHARS]
+    start = max(0, len(first) - len(second))
+    while (index := first.find(probe, start)) != -1:
+        if second.startswith(first[index:]):
+            return len(first) - index
+        start = index + 1
+    return 0
+
+def _join(first, second):
+    """
+    Join two chunks of the same page if `second` continues `first`.
+
+    Chunks of a long section repeat the section's heading line, which is dropped from `second`.
+
+    Returns:
+        str or None: The joined text, or None if the chunks do not overlap.
+    """
+    if second in first:
+        return first
+    header, _, body = second.partition("\n")
+    if body and first.startswith(header + "\n"):
+        candidates = (second, body)
+    else:
+        candidates = (second,)
+    for candidate in candidates:
+        overlap = _overlap(first, candidate)
+        if overlap:
+            return first + candidate[overlap:]
+    return None
+
+def _merge_group(texts):
+    """Merge the chunks of one page while any pair overlaps, removing the repeated text."""
+    texts = list(dict.fromkeys(texts))
+    merged = True
+    while merged and len(texts) > 1:
+        merged = False
+        for i, first in enumerate(texts):
+            for j, second in enumerate(texts):
+                if i == j:
+                    continue
+                joined = _join(first, second)
+                if joined is not None:
+                    texts[i] = joined
+                    del texts[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return texts
+
+def assemble_context(results, model, max_tokens=None):
+    """
+    Build the LLM context from retrieved chunks within the token budget of `model`.
+
+    Chunks from the same source and page form one block, in page order when their
+    `start_index` is known, and are merged where they overlap so splitter overlap is sent once.
+    Blocks are ordered by the rank of their best chunk (results are expected best first) and
+    added until the budget is spent; the last block is truncated if a useful part of it still fits.
+
+    Args:
+        results (list[tuple[Document, float]]): Retrieved chunks with scores, best first.
+        model (str): Chat model the context is sent to.
+        max_tokens (int, optional): Budget override; defaults to `context_budget(model)`.
+
+    Returns:
+        str: The context, or an empty string if nothing was retrieved.
+    """
+    budget = context_budget(model) if max_tokens is None else max_tokens
+    groups = {}
+    for document, _ in results:
+        key = (document.metadata.get("source", ""), document.metadata.get("page", ""))
+        groups.setdefault(key, []).append(document)
+
+    # Dicts keep insertion order, so groups are already ordered by their best chunk
+    blocks = []
+    for (source, page), documents in groups.items():
+        documents = sorted(documents, key=lambda document: document.metadata.get("start_index", -1))
+        runs = _merge_group([document.page_content for document in documents])
+        # Later runs of a long section repeat its heading line, which the first run already has
+        header = runs[0].partition("\n")[0] + "\n"
+        runs = runs[:1] + [run[len(header):] if run.startswith(header) else run for run in runs[1:]]
+        text = "\n\n".join(runs)
+        blocks.append(f"Source: {source}, Page: {page}\n{text}")
+
+    parts, used = [], 0
+    separator_tokens = count_tokens("\n\n")
+    for block in blocks:
+        tokens = count_tokens(block) + (separator_tokens if parts else 0)
+        if used + tokens <= budget:
+            parts.append(block)
+            used += tokens
+            continue
+        remaining = budget - used - (separator_tokens if parts else 0)
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            parts.append(truncate_tokens(block, remaining))
+            used += remaining
+        break
+
+    logger.info(
+        "Assembled context from {} chunks into {} of {} blocks, ~{} tokens (budget {}).",
+        len(results), len(parts), len(blocks), used, budget
+    )
+    return "\n\n".join(parts)
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+def normalize_text(text):
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(text.split())
+
+def text_hash(text):
+    """SHA-256 of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def cache_key(model, text):
+    """Cache key for the embedding of `text` produced by `model`."""
+    return f"{model}:{text_hash(text)}"
+
+class DiskEmbeddingStore:
+    """
+    SQLite-backed embedding store with size-based eviction.
+
+    Vectors are stored as float32 blobs. When the stored bytes exceed `max_bytes`,
+    the least recently used entries are deleted until the store is back under 90% of the limit.
+    Access times of hits are kept in memory and written in one batch every `flush_seconds`
+    or `flush_items` hits, before eviction and on close, so reads do not commit.
+    """
+
+    def __init__(self, path, max_bytes, flush_seconds=60.0, flush_items=1000):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_seconds = flush_seconds
+        self.flush_items = flush_items
+        self._accessed = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        """Return a dict of the vectors found for `keys`."""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update({key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows})
+            if found:
+                now = time.time()
+                self._accessed.update((key, now) for key in found)
+                if (len(self._accessed) >= self.flush_items
+                        or time.monotonic() - self._flushed_at >= self.flush_seconds):
+                    self._flush_accessed()
+                    self._conn.commit()
+        return found
+
+    def _flush_accessed(self):
+        """Write the pending access times; the caller holds the lock and commits."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE embeddings SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+        self._flushed_at = time.monotonic()
+
+    def put_many(self, items):
+        """Store `(key, vector)` pairs and evict old entries if the size limit is exceeded."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, size, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            # Keys were just looked up and missed, so they are almost always new
+            self._total_bytes += sum(row[2] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        # Recent hits must be on disk before the least recently used entries are chosen
+        self._flush_accessed()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        while self._total_bytes > target:
+            rows = self._conn.execute("SELECT key, size FROM embeddings ORDER BY accessed LIMIT 1000").fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            self._total_bytes -= sum(size for _, size in rows)
+            removed += len(rows)
+        self._conn.commit()
+        logger.info("Evicted {} entries from the embedding cache.", removed)
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            self._conn.close()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an in-memory LRU backed by a disk store.
+
+    Keys are `(model, normalized text hash)`, so the cache is shared by ingestion and queries
+    and survives restarts. Only the texts that miss both tiers are sent to the wrapped client,
+    each unique text once.
+    """
+
+    def __init__(self, embeddings, model, disk_store=None, memory_items=10000):
+        self.embeddings = embeddings
+        self.model = model
+        self.disk_store = disk_store
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        missing = [key for key in keys if key not in found]
+        if missing and self.disk_store is not None:
+            from_disk = self.disk_store.get_many(missing)
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            found.update(from_disk)
+        return found
+
+    def _embed(self, texts, embed_fn):
+        keys = [cache_key(self.model, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        pending = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in found:
+                pending.setdefault(key, text)
+        with self._lock:
+            self.hits += len(texts) - sum(1 for key in keys if key not in found)
+            self.misses += len(pending)
+        if pending:
+            vectors = embed_fn(list(pending.values()))
+            new_items = list(zip(pending.keys(), vectors))
+            for key, vector in new_items:
+                self._remember(key, vector)
+                found[key] = vector
+            if self.disk_store is not None:
+                self.disk_store.put_many(new_items)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory)}
+
+    def close(self):
+        if self.disk_store is not None:
+            self.disk_store.close()
@@ -0,0 +1,187 @@
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from langchain_core.documents import Document
+from app.core.config import (
+    EMBED_BATCH_TOKENS,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_RETRY_BASE_SECONDS,
+)
+from app.utils.tokens import count_tokens
+from app.utils.metrics import timed, record_tokens
+from app.utils.embedding_cache import text_hash
+from app.utils.vector_store import add_embeddings, get_existing_ids
+from app.utils.async_store import store_writes
+from loguru import logger
+
+def chunk_id(chunk):
+    """
+    Deterministic record id of a chunk, derived from its source, location and normalized text.
+
+    The page and `start_index` are part of the id, so identical text on two pages, or twice on
+    one page, is stored once per location; uploading the same file again yields the same ids.
+    """
+    metadata = chunk.metadata
+    location = f"{metadata.get('page', '')}\0{metadata.get('start_index', '')}"
+    key = f"{metadata.get('source', '')}\0{location}\0{text_hash(chunk.page_content)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def iter_token_batches(chunks, max_tokens=EMBED_BATCH_TOKENS, max_items=EMBED_BATCH_SIZE):
+    """
+    Group chunks into batches bounded by total token count and number of items.
+
+    A single chunk larger than `max_tokens` is sent as a batch of its own.
+
+    Args:
+        chunks (Iterable[Document]): Chunks to group. Consumed lazily.
+        max_tokens (int): Token budget per batch.
+        max_items (int): Maximum number of chunks per batch.
+
+    Yields:
+        list[Document]: The next batch of chunks.
+    """
+    batch, batch_tokens = [], 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk.page_content)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            record_tokens("embedding", batch_tokens)
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        record_tokens("embedding", batch_tokens)
+        yield batch
+
+def embed_with_retry(embeddings, texts, max_retries=EMBED_MAX_RETRIES, base_delay=EMBED_RETRY_BASE_SECONDS):
+    """
+    Embed `texts` in one request, backing off exponentially with jitter on rate limits.
+
+    Args:
+        embeddings (Embeddings): Embedding client.
+        texts (list[str]): Texts to embed.
+        max_retries (int): Retries allowed after the first attempt.
+        base_delay (float): Delay before the first retry, in seconds.
+
+    Returns:
+        list[list[float]]: One embedding per text.
+    """
+    from openai import RateLimitError
+    attempt = 0
+    while True:
+        try:
+            with timed("embedding", "embed_batch"):
+                return embeddings.embed_documents(texts)
+        except RateLimitError:
+            if attempt >= max_retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            logger.warning("Embedding rate limited, retrying in {:.2f}s (attempt {}/{}).", delay, attempt + 1, max_retries)
+            time.sleep(delay)
+            attempt += 1
+
+def embed_texts(embeddings, texts, concurrency=EMBED_CONCURRENCY):
+    """
+    Embed `texts` in token-bounded batches with up to `concurrency` requests in flight.
+
+    Returns:
+        list[list[float]]: One embedding per text, in input order.
+    """
+    batches = list(iter_token_batches([Document(page_content=text) for text in texts]))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed") as executor:
+        results = executor.map(
+            lambda batch: embed_with_retry(embeddings, [doc.page_content for doc in batch]), batches
+        )
+        return [vector for vectors in results for vector in vectors]
+
+class EmbeddingPipeline:
+    """
+    Embed chunks in token-bounded batches with several requests in flight, and write
+    each finished batch to the vector store in bulk.
+
+    Chunks get ids derived from their content and location, so chunks that are already stored
+    (e.g. when the same file is uploaded again) are skipped before they are embedded or written.
+    Store lookups and writes run on the vector store write pool, so concurrent ingestion jobs
+    share its writer threads instead of writing to the store at the same time. Written chunks
+    are also added to `lexical_index`, when one is given.
+    The number of batches held in memory is bounded, which keeps memory flat when
+    chunks arrive from a lazy iterator.
+    """
+
+    def __init__(self, vectorstore, embeddings, concurrency=EMBED_CONCURRENCY,
+                 batch_tokens=EMBED_BATCH_TOKENS, batch_size=EMBED_BATCH_SIZE, lexical_index=None):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.lexical_index = lexical_index
+        self.concurrency = max(1, concurrency)
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+
+    def _new_chunks(self, batch, seen):
+        """Drop chunks that are already stored or repeated earlier in this run, and attach their ids."""
+        ids = [chunk_id(chunk) for chunk in batch]
+        unseen = list(dict.fromkeys(i for i in ids if i not in seen))
+        with timed("upload", "dedupe"):
+            existing = store_writes.call(get_existing_ids, self.vectorstore, unseen)
+        new = []
+        for record_id, chunk in zip(ids, batch):
+            if record_id in seen or record_id in existing:
+                continue
+            seen.add(record_id)
+            new.append((record_id, chunk))
+        return new
+
+    def _write(self, batch, vectors, on_embedded, on_written):
+        if on_embedded:
+            on_embedded(len(batch))
+        ids = [record_id for record_id, _ in batch]
+        texts = [chunk.page_content for _, chunk in batch]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        with timed("upload", "store_write"):
+            store_writes.call(add_embeddings, self.vectorstore, texts, vectors, metadatas, ids)
+        if self.lexical_index is not None:
+            with timed("upload", "lexical_index"):
+                store_writes.call(self.lexical_index.add, ids, texts, metadatas)
+        if on_written:
+            on_written(len(batch))
+        return len(batch)
+
+    def run(self, chunks, on_embedded=None, on_written=None, on_skipped=None):
+        """
+        Embed and store `chunks`.
+
+        Args:
+            chunks (Iterable[Document]): Chunks whose metadata is stored as-is.
+            on_embedded (Callable[[int], None], optional): Called with the size of each embedded batch.
+            on_written (Callable[[int], None], optional): Called with the size of each stored batch.
+            on_skipped (Callable[[int], None], optional): Called with the number of already stored chunks in each batch.
+
+        Returns:
+            int: Number of chunks written.
+        """
+        written = 0
+        skipped = 0
+        seen = set()
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as executor:
+            for batch in iter_token_batches(chunks, self.batch_tokens, self.batch_size):
+                new = self._new_chunks(batch, seen)
+                if len(new) < len(batch):
+                    skipped += len(batch) - len(new)
+                    if on_skipped:
+                        on_skipped(len(batch) - len(new))
+                if not new:
+                    continue
+                if len(pending) >= self.concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        written += self._write(pending.pop(future), future.result(), on_embedded, on_written)
+                texts = [chunk.page_content for _, chunk in new]
+                pending[executor.submit(embed_with_retry, self.embeddings, texts)] = new
+            for future in list(pending):
+                written += self._write(pending.pop(future), future.result(), on_embedded, on_written)
+        logger.info("Embedding pipeline wrote {} chunks, skipped {} already stored.", written, skipped)
+        return written
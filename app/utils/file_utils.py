@@ -1,26 +1,83 @@
 import os
 import tempfile
 from fastapi import UploadFile, HTTPException
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_core.documents import Document
+from app.core.config import MAX_UPLOAD_BYTES, UPLOAD_COPY_BLOCK_BYTES, TEXT_SEGMENT_CHARS
+from app.utils.pdf_parsing import pdf_parser
 
 def validate_file_type(file: UploadFile):
     if file.content_type not in ["application/pdf", "text/plain"]:
         raise HTTPException(status_code=400, detail="Unsupported file type. Upload a PDF or text file.")
 
-def load_document(file: UploadFile):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename.split('.')[-1]) as temp_file:
-        temp_file.write(file.file.read())
-        temp_file_path = temp_file.name
-
-    if file.content_type == "application/pdf":
-        loader = PyPDFLoader(temp_file_path)
-    elif file.content_type == "text/plain":
-        loader = TextLoader(temp_file_path)
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"File too large. The maximum upload size is {max_bytes} bytes.")
+
+def save_upload(file: UploadFile, max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_COPY_BLOCK_BYTES):
+    """
+    Copy the uploaded file to a temporary file in fixed-size blocks and return its path. The caller removes it.
+
+    Raises:
+        HTTPException: 413 as soon as the upload is known to exceed `max_bytes`.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or "")[1]) as temp_file:
+        try:
+            copied = 0
+            while block := file.file.read(block_size):
+                copied += len(block)
+                if copied > max_bytes:
+                    raise _too_large(max_bytes)
+                temp_file.write(block)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+        return temp_file.name
+
+def _iter_text_segments(path, segment_chars=TEXT_SEGMENT_CHARS):
+    """Read a text file in segments of about `segment_chars` characters, cut at paragraph breaks where possible."""
+    with open(path) as f:
+        carry = ""
+        while block := f.read(segment_chars):
+            text = carry + block
+            cut = text.rfind("\n\n")
+            if cut <= 0:
+                cut = len(text)
+            carry = text[cut:]
+            yield Document(page_content=text[:cut])
+        if carry.strip():
+            yield Document(page_content=carry)
+
+def iter_document_pages(path, content_type, filename):
+    """
+    Parse a saved upload lazily, one page (PDF) or text segment at a time.
+
+    Large PDFs are parsed in a process pool, see `ParallelPdfParser`.
+
+    Returns:
+        Iterator[Document]: Pages with `source` set to `filename`, read only as they are consumed.
+    """
+    if content_type == "application/pdf":
+        return pdf_parser.iter_pages(path, filename)
+    elif content_type == "text/plain":
+        pages = _iter_text_segments(path)
     else:
         raise HTTPException(status_code=400, detail="Unsupported file type. Upload a PDF or text file.")
 
-    documents = loader.load()
-    for document in documents:
-        document.metadata["source"] = file.filename
-    os.unlink(temp_file_path)
-    return documents
+    def with_source():
+        for page in pages:
+            page.metadata["source"] = filename
+            yield page
+
+    return with_source()
+
+def load_document_from_path(path, content_type, filename):
+    return list(iter_document_pages(path, content_type, filename))
+
+def load_document(file: UploadFile):
+    temp_file_path = save_upload(file)
+    try:
+        return load_document_from_path(temp_file_path, file.content_type, file.filename)
+    finally:
+        os.unlink(temp_file_path)
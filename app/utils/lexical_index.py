@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from langchain_core.documents import Document
+from app.utils.vector_store import get_records, count_records
+from loguru import logger
+
+# Words, numbers and identifiers such as "AB-1234/5", "4.2.1" or "clause_7"
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_./:]\w+)*")
+# Characters kept inside FTS5 tokens, so identifiers are indexed whole
+TOKEN_CHARS = "-_./:"
+BACKFILL_PAGE_SIZE = 1000
+
+def tokenize(text):
+    """
+    Lowercased index terms of `text`.
+
+    Identifiers with inner punctuation are kept whole and also split into their parts,
+    so "AB-1234" matches queries for "AB-1234" (best) as well as for "1234".
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        if any(char in token for char in TOKEN_CHARS):
+            terms.extend(part for part in re.split(r"[-_./:]", token) if part)
+    return terms
+
+class LexicalIndex:
+    """
+    BM25 keyword index over the chunks of one vector store, in an SQLite FTS5 table.
+
+    Chunks are indexed under the same ids as in the vector store, with their text and
+    metadata, so keyword searches return the same documents as vector searches without
+    an embedding call or a vector store read. The index is updated as chunks are written
+    and is rebuilt from the vector store when it has fallen behind, e.g. for a store that
+    was filled before the index existed.
+
+    With `read_only`, the database is opened as an immutable file and is never written, so
+    any number of processes can share one published copy.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(terms, tokenize=\"unicode61 tokenchars '{TOKEN_CHARS}'\")"
+        )
+        self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids, texts, metadatas):
+        """
+        Index chunks; ids that are already indexed are skipped.
+
+        Returns:
+            int: Number of chunks added.
+        """
+        added = 0
+        with self._lock:
+            for record_id, text, metadata in zip(ids, texts, metadatas):
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                    (record_id, text, json.dumps(metadata or {}))
+                )
+                if cursor.rowcount:
+                    self._conn.execute(
+                        "INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)", (cursor.lastrowid, " ".join(tokenize(text)))
+                    )
+                    added += 1
+            self._conn.commit()
+        return added
+
+    def search(self, query, k):
+        """
+        Rank indexed chunks against the terms of `query` with BM25.
+
+        Returns:
+            list[tuple[str, Document, float]]: `(id, document, score)` tuples, best first; higher scores are better.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunks.id, chunks.text, chunks.metadata, bm25(chunk_terms) AS rank "
+                "FROM chunk_terms JOIN chunks ON chunks.rowid = chunk_terms.rowid "
+                "WHERE chunk_terms MATCH ? ORDER BY rank LIMIT ?",
+                (match, k)
+            ).fetchall()
+        # FTS5 reports BM25 negated so that ascending order is best first
+        return [
+            (record_id, Document(page_content=text, metadata=json.loads(metadata)), -rank)
+            for record_id, text, metadata, rank in rows
+        ]
+
+    def sync(self, vectorstore):
+        """Index every chunk of `vectorstore` that is missing, if the index holds fewer chunks than the store."""
+        stored = count_records(vectorstore)
+        indexed = self.count()
+        if indexed >= stored:
+            return 0
+        logger.info("Lexical index at '{}' has {} of {} chunks, indexing the rest.", self.path, indexed, stored)
+        added, offset = 0, 0
+        while True:
+            items = get_records(vectorstore, limit=BACKFILL_PAGE_SIZE, offset=offset)
+            added += self.add(items["ids"], items["documents"], items["metadatas"])
+            if len(items["ids"]) < BACKFILL_PAGE_SIZE:
+                break
+            offset += BACKFILL_PAGE_SIZE
+        logger.info("Lexical index at '{}' caught up, {} chunks added.", self.path, added)
+        return added
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings of `(id, document, score)` tuples by reciprocal rank.
+
+    Each ranking adds `1 / (k + rank)` to the fused score of every id it contains.
+
+    Returns:
+        list[tuple[str, Document, float]]: Every id once with its fused score, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (record_id, document, _) in enumerate(ranking, start=1):
+            entry = fused.setdefault(record_id, [document, 0.0])
+            entry[1] += 1.0 / (k + rank)
+    ranked = sorted(fused.items(), key=lambda item: item[1][1], reverse=True)
+    return [(record_id, document, score) for record_id, (document, score) in ranked]
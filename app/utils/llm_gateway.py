@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from app.core.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_SECONDS,
+)
+from app.utils.metrics import metrics
+from loguru import logger
+
+LLM_CALLS = metrics.counter("rag_llm_calls_total", "Chat completion calls sent upstream, by outcome.")
+LLM_RETRIES = metrics.counter("rag_llm_retries_total", "Chat completion attempts retried after a rate limit or connection error.")
+LLM_COALESCED = metrics.counter("rag_llm_coalesced_total", "Chat completions served by an identical call already in flight.")
+
+# Longest Retry-After hint from the API that is honoured instead of the computed backoff
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+def _retry_after(error):
+    """Seconds the API asked us to wait, if it said so."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(value), MAX_RETRY_AFTER_SECONDS) if value else None
+    except ValueError:
+        return None
+
+class LLMGateway:
+    """
+    Single path for every chat completion the service sends.
+
+    All calls share one `AsyncOpenAI` client whose HTTP connections are pooled and kept alive,
+    and at most `max_concurrency` completions (streamed or not) are in flight at once; further
+    calls wait for a slot. Calls rejected with a rate limit or a connection error are retried
+    with exponential, jittered backoff. Identical non-streamed calls that arrive while one is in
+    flight share its upstream request and its answer.
+
+    The client, semaphore and in-flight calls belong to the event loop that first used them and
+    are recreated if the gateway is used from another loop.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_connections=LLM_MAX_CONNECTIONS,
+                 timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES, base_delay=LLM_RETRY_BASE_SECONDS):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._client = None
+        self._owns_client = False
+        self._loop = None
+        self._semaphore = None
+        self._inflight = {}
+
+    def use_client(self, client):
+        """Send completions through `client` instead of the pooled `AsyncOpenAI` client."""
+        self._client = client
+        self._owns_client = False
+
+    def _create_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+        logger.info("Creating pooled LLM client with {} connections.", self.max_connections)
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+        )
+        # Retries are done here, where they can be counted and do not hold extra connections
+        return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+    def _bind(self):
+        """Return the client, creating the loop-bound state on first use in this event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+            if self._owns_client:
+                # Its connections belong to the previous loop
+                self._client = None
+        if self._client is None:
+            self._client = self._create_client()
+            self._owns_client = True
+        return self._client
+
+    async def connect(self):
+        """Create the pooled client for the running event loop ahead of the first call."""
+        self._bind()
+
+    async def _create(self, client, **kwargs):
+        """Send one completion request, retrying rate limits and connection errors with backoff."""
+        from openai import APIConnectionError, RateLimitError
+        attempt = 0
+        while True:
+            try:
+                response = await client.chat.completions.create(**kwargs)
+                LLM_CALLS.inc(model=kwargs["model"], outcome="ok")
+                return response
+            except (RateLimitError, APIConnectionError) as e:
+                if attempt >= self.max_retries:
+                    LLM_CALLS.inc(model=kwargs["model"], outcome="failed")
+                    raise
+                delay = _retry_after(e) or self.base_delay * (2 ** attempt) * (0.5 + random.random())
+                LLM_RETRIES.inc(model=kwargs["model"], reason=type(e).__name__)
+                logger.warning(
+                    "{} call failed ({}), retrying in {:.2f}s (attempt {}/{}).",
+                    kwargs["model"], type(e).__name__, delay, attempt + 1, self.max_retries
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+            except Exception:
+                LLM_CALLS.inc(model=kwargs["model"], outcome="failed")
+                raise
+
+    async def _complete_once(self, client, model, messages):
+        async with self._semaphore:
+            return await self._create(client, model=model, messages=messages)
+
+    async def complete(self, model, messages):
+        """
+        Run one chat completion.
+
+        Returns:
+            ChatCompletion: The response; shared with any identical call that was already in flight.
+        """
+        client = self._bind()
+        key = hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._complete_once(client, model, messages))
+            self._inflight[key] = task
+            inflight = self._inflight
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        else:
+            LLM_COALESCED.inc(model=model)
+        # A caller that goes away must not cancel the call for the others waiting on it
+        return await asyncio.shield(task)
+
+    async def stream(self, model, messages):
+        """
+        Stream one chat completion, holding a concurrency slot until the stream ends.
+
+        Only the request that opens the stream is retried; streams are never shared.
+
+        Yields:
+            ChatCompletionChunk: Chunks as they arrive; the last one carries the token usage.
+        """
+        client = self._bind()
+        async with self._semaphore:
+            stream = await self._create(
+                client, model=model, messages=messages, stream=True, stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                yield chunk
+
+    async def close(self):
+        """Close the pooled client and its connections."""
+        client, owns_client = self._client, self._owns_client
+        if owns_client:
+            self._client = None
+            self._owns_client = False
+        self._loop = None
+        self._inflight = {}
+        if owns_client and client is not None:
+            await client.close()
+            logger.info("LLM client closed.")
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,555 @@
+import itertools
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from langchain_core.documents import Document
+from app.core.config import (
+    LOCAL_STORE_IVF_MIN_ROWS,
+    LOCAL_STORE_IVF_NPROBE,
+    LOCAL_STORE_IVF_PROBE_FRACTION,
+    LOCAL_STORE_QUANTIZATION,
+    LOCAL_STORE_RESCORE_FACTOR,
+)
+from loguru import logger
+
+VECTORS_FILE = "vectors.f32"
+NORMS_FILE = "norms.f32"
+RECORDS_FILE = "records.jsonl"
+# Sidecars of the records file: the id of each row, one JSON string per line, and the int64
+# byte offset of each row's record, so loading never parses the record texts
+IDS_FILE = "ids.jsonl"
+OFFSETS_FILE = "offsets.i64"
+INFO_FILE = "info.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGN_FILE = "ivf_assign.i32"
+CODES_FILES = {"float16": "codes.f16", "int8": "codes.i8"}
+CODE_DTYPES = {"float16": np.float16, "int8": np.int8}
+SCALES_FILE = "scales.f32"
+QUANTIZATIONS = ("none",) + tuple(CODES_FILES)
+# Rows of compact codes expanded to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 65536
+
+def _append(path, array):
+    with open(path, "ab") as f:
+        f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+def _top_k(distances, k):
+    """Indices of the `k` smallest distances, sorted ascending."""
+    k = min(k, len(distances))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(distances):
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(len(distances))
+    return candidates[np.argsort(distances[candidates])]
+
+def quantize(vectors, quantization):
+    """
+    Compact codes of float32 `vectors`.
+
+    int8 codes are scaled per row so that the largest component maps to 127.
+
+    Returns:
+        tuple: The codes and, for int8, the float32 scale of each row (None for float16).
+    """
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def _approx_products(codes, scales, queries, rows=None):
+    """Approximate `matrix[rows] @ queries.T` from compact codes, a block of rows at a time."""
+    total = len(codes) if rows is None else len(rows)
+    products = np.empty((total, len(queries)), dtype=np.float32)
+    for start in range(0, total, SCORE_BLOCK_ROWS):
+        block = slice(start, start + SCORE_BLOCK_ROWS)
+        index = block if rows is None else rows[block]
+        products[block] = np.asarray(codes[index], dtype=np.float32) @ queries.T
+        if scales is not None:
+            products[block] *= scales[index][:, None]
+    return products
+
+def kmeans(vectors, clusters, iterations=10, seed=0):
+    """Plain Lloyd's k-means, used to train the IVF coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(vectors, centroids)
+        for c in range(clusters):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+def write_lock(directory):
+    """
+    Write lock of the local store in `directory`, shared by every `LocalVectorStore` opened on it.
+
+    Holding it keeps the store's files consistent with each other, e.g. while they are copied.
+    """
+    with _write_locks_guard:
+        return _write_locks.setdefault(os.path.abspath(directory), threading.RLock())
+
+def _nearest_centroid(vectors, centroids):
+    distances = (centroids ** 2).sum(axis=1)[None, :] - 2.0 * vectors @ centroids.T
+    return distances.argmin(axis=1).astype(np.int32)
+
+class LocalVectorStore:
+    """
+    In-process vector store backed by flat files.
+
+    Embeddings live in a float32 matrix file that is memory-mapped for search, next to a
+    float32 file of row norms and a JSON-lines file with each record's id, text and metadata.
+    The ids and the offset of each record are also kept in two small sidecar files. Additions
+    append to all of these, so the store grows incrementally and loads without parsing records.
+
+    Search returns squared L2 distances, like the default Chroma collection. Collections
+    smaller than `ivf_min_rows` are searched exactly with NumPy. Larger ones are searched
+    through an IVF index: a k-means coarse quantizer trained on the stored vectors, where
+    only the rows of the closest lists are scored exactly: `probe_fraction` of the lists, and
+    at least `nprobe`, so recall holds as the number of lists grows with the collection. New
+    rows are assigned to the existing lists, and the quantizer is retrained once the collection
+    has doubled. Training runs on a background thread, searches use the old lists until it is
+    done, and its result is then swapped in.
+
+    With `quantization` set to 'float16' or 'int8', a compact copy of every vector is kept
+    in a second file and searches score those codes instead of the float32 matrix, which
+    takes half or a quarter of the memory. The best `rescore_factor * k` rows are then
+    rescored exactly against the float32 vectors, read from disk for those rows only, so
+    the returned distances and order are exact. Codes missing for rows written before
+    quantization was enabled are built when the store loads.
+
+    With `read_only`, e.g. for a version published to reader processes, nothing is written:
+    the files are only memory-mapped up to the committed `count`, bytes past it are left alone,
+    and searches fall back to the float32 vectors if the files hold no codes for `quantization`.
+    """
+
+    def __init__(self, directory, embedding_function, ivf_min_rows=LOCAL_STORE_IVF_MIN_ROWS,
+                 nprobe=LOCAL_STORE_IVF_NPROBE, probe_fraction=LOCAL_STORE_IVF_PROBE_FRACTION,
+                 quantization=LOCAL_STORE_QUANTIZATION,
+                 rescore_factor=LOCAL_STORE_RESCORE_FACTOR, read_only=False):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {', '.join(QUANTIZATIONS)}.")
+        self.directory = directory
+        self._embedding_function = embedding_function
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.probe_fraction = probe_fraction
+        self.quantization = None if quantization == "none" else quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.read_only = read_only
+        self._write_lock = write_lock(directory)
+        self._trainer = None
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        info = {}
+        if os.path.exists(self._path(INFO_FILE)):
+            with open(self._path(INFO_FILE)) as f:
+                info = json.load(f)
+        self.dim = info.get("dim")
+        self.count = info.get("count", 0)
+        self._ivf_trained_at = info.get("ivf_trained_at", 0)
+
+        # Record ids and the byte offset of each record line; texts are read on demand
+        self._ids, self._offsets = self._read_index()
+        self._rows = {record_id: row for row, record_id in enumerate(self._ids)}
+        if not self.read_only:
+            self._truncate_partial_writes()
+
+        self._centroids = None
+        self._assign = None
+        if os.path.exists(self._path(IVF_CENTROIDS_FILE)):
+            self._centroids = np.load(self._path(IVF_CENTROIDS_FILE))
+            self._assign = np.fromfile(self._path(IVF_ASSIGN_FILE), dtype=np.int32)[:self.count]
+        if self.quantization and not self.read_only:
+            self._build_missing_codes()
+        elif self.quantization and not self._has_codes():
+            logger.warning("No {} codes for all rows in {}, searching the float32 vectors.", self.quantization, self.directory)
+            self.quantization = None
+        self._map()
+        logger.info("Local vector store loaded from {} with {} records.", self.directory, self.count)
+
+    def _read_index(self):
+        """
+        Ids and record offsets of the committed rows.
+
+        They are read from the sidecar files. Stores written before the sidecars existed, or whose
+        sidecars fall short of `count`, are indexed from the records once, and the sidecars are
+        written unless the store is read-only.
+        """
+        self._ids_size = 0
+        if self.count == 0:
+            return [], []
+        if os.path.exists(self._path(IDS_FILE)) and os.path.exists(self._path(OFFSETS_FILE)):
+            rows = min(self.count, os.path.getsize(self._path(OFFSETS_FILE)) // 8)
+            offsets = np.fromfile(self._path(OFFSETS_FILE), dtype=np.int64, count=rows)
+            with open(self._path(IDS_FILE), "rb") as f:
+                lines = list(itertools.islice(f, self.count))
+            if len(offsets) == self.count and len(lines) == self.count:
+                self._ids_size = sum(len(line) for line in lines)
+                return json.loads(b"[" + b",".join(lines) + b"]"), offsets.tolist()
+
+        logger.info("Indexing the records of {} into its id and offset files.", self.directory)
+        ids, offsets = [], []
+        with open(self._path(RECORDS_FILE), "rb") as f:
+            offset = f.tell()
+            for line in iter(f.readline, b""):
+                if len(ids) == self.count:
+                    break
+                ids.append(json.loads(line)["id"])
+                offsets.append(offset)
+                offset = f.tell()
+        if not self.read_only:
+            lines = "".join(json.dumps(record_id) + "\n" for record_id in ids).encode("utf-8")
+            for name, data in ((IDS_FILE, lines), (OFFSETS_FILE, np.asarray(offsets, dtype=np.int64).tobytes())):
+                temp_path = self._path(name) + ".tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(name))
+            self._ids_size = len(lines)
+        return ids, offsets
+
+    def _truncate_partial_writes(self):
+        """Drop bytes appended after the last committed count, e.g. by a crash mid-write."""
+        sizes = {
+            VECTORS_FILE: self.count * (self.dim or 0) * 4,
+            NORMS_FILE: self.count * 4,
+            IVF_ASSIGN_FILE: self.count * 4,
+            SCALES_FILE: self.count * 4,
+            IDS_FILE: self._ids_size,
+            OFFSETS_FILE: self.count * 8,
+        }
+        for quantization, name in CODES_FILES.items():
+            sizes[name] = self.count * (self.dim or 0) * np.dtype(CODE_DTYPES[quantization]).itemsize
+        if os.path.exists(self._path(RECORDS_FILE)):
+            sizes[RECORDS_FILE] = self._offsets[self.count - 1] if self.count else 0
+            if self.count:
+                with open(self._path(RECORDS_FILE), "rb") as f:
+                    f.seek(sizes[RECORDS_FILE])
+                    sizes[RECORDS_FILE] += len(f.readline())
+        for name, size in sizes.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning("Truncating uncommitted data in {}.", path)
+                os.truncate(path, size)
+
+    def _code_rows(self):
+        path = self._path(CODES_FILES[self.quantization])
+        if not os.path.exists(path) or not self.dim:
+            return 0
+        return os.path.getsize(path) // (self.dim * np.dtype(CODE_DTYPES[self.quantization]).itemsize)
+
+    def _has_codes(self):
+        if self._code_rows() < self.count:
+            return False
+        scales = self._path(SCALES_FILE)
+        return self.quantization != "int8" or self.count == 0 or (
+            os.path.exists(scales) and os.path.getsize(scales) >= self.count * 4
+        )
+
+    def _append_codes(self, vectors):
+        codes, scales = quantize(vectors, self.quantization)
+        _append(self._path(CODES_FILES[self.quantization]), codes)
+        if scales is not None:
+            _append(self._path(SCALES_FILE), scales)
+
+    def _build_missing_codes(self):
+        """Quantize the rows that have no codes yet, e.g. after quantization was turned on."""
+        start = self._code_rows()
+        if start >= self.count:
+            return
+        logger.info("Quantizing {} local store rows to {}.", self.count - start, self.quantization)
+        if self.quantization == "int8" and os.path.exists(self._path(SCALES_FILE)):
+            # Scales may lag behind codes only after a crash between the two appends
+            os.truncate(self._path(SCALES_FILE), start * 4)
+        matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        for block in range(start, self.count, SCORE_BLOCK_ROWS):
+            self._append_codes(np.asarray(matrix[block:block + SCORE_BLOCK_ROWS]))
+
+    def _map(self):
+        """Memory-map the vector and norm files and publish a consistent view for readers."""
+        codes, scales = None, None
+        if self.count == 0:
+            matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+            norms = np.empty(0, dtype=np.float32)
+        else:
+            matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            norms = np.memmap(self._path(NORMS_FILE), dtype=np.float32, mode="r", shape=(self.count,))
+            if self.quantization:
+                codes = np.memmap(
+                    self._path(CODES_FILES[self.quantization]), dtype=CODE_DTYPES[self.quantization],
+                    mode="r", shape=(self.count, self.dim)
+                )
+            if self.quantization == "int8":
+                scales = np.memmap(self._path(SCALES_FILE), dtype=np.float32, mode="r", shape=(self.count,))
+        lists = None
+        if self._centroids is not None:
+            order = np.argsort(self._assign, kind="stable")
+            bounds = np.searchsorted(self._assign[order], np.arange(len(self._centroids) + 1))
+            lists = (order, bounds)
+        # Readers take this tuple once per search, so they never see a half-applied write
+        self._view = (matrix, norms, self._centroids, lists, codes, scales)
+
+    def _write_info(self):
+        temp_path = self._path(INFO_FILE) + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "ivf_trained_at": self._ivf_trained_at}, f)
+        os.replace(temp_path, self._path(INFO_FILE))
+
+    def add_embeddings(self, texts, vectors, metadatas=None, ids=None):
+        """Append records with pre-computed embeddings. Returns the ids written."""
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if not texts:
+            return ids
+        if self.read_only:
+            raise ValueError(f"The vector store in {self.directory} is read-only.")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._write_lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store dimension {self.dim}.")
+
+            new = [i for i, record_id in enumerate(ids) if record_id not in self._rows]
+            if not new:
+                return ids
+            vectors = vectors[new]
+            _append(self._path(VECTORS_FILE), vectors)
+            _append(self._path(NORMS_FILE), (vectors ** 2).sum(axis=1).astype(np.float32))
+            if self.quantization:
+                self._append_codes(vectors)
+            with open(self._path(RECORDS_FILE), "ab") as f:
+                offset = f.tell()
+                offsets = []
+                for i in new:
+                    line = (json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i]}) + "\n").encode("utf-8")
+                    f.write(line)
+                    offsets.append(offset)
+                    offset += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+            id_lines = "".join(json.dumps(ids[i]) + "\n" for i in new).encode("utf-8")
+            _append(self._path(IDS_FILE), np.frombuffer(id_lines, dtype=np.uint8))
+            _append(self._path(OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+            self._ids_size += len(id_lines)
+            for i, offset in zip(new, offsets):
+                self._rows[ids[i]] = len(self._ids)
+                self._ids.append(ids[i])
+                self._offsets.append(offset)
+
+            if self._centroids is not None:
+                assign = _nearest_centroid(vectors, self._centroids)
+                _append(self._path(IVF_ASSIGN_FILE), assign)
+                self._assign = np.concatenate([self._assign, assign])
+            self.count += len(new)
+            self._write_info()
+            self._map()
+
+            training = self._trainer is not None and self._trainer.is_alive()
+            if not training and self.count >= self.ivf_min_rows and self.count >= 2 * self._ivf_trained_at:
+                self._trainer = threading.Thread(target=self._train_ivf, name="ivf-train", daemon=True)
+                self._trainer.start()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embed `texts` and append them. Returns the ids written."""
+        texts = list(texts)
+        vectors = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def _train_ivf(self):
+        """
+        Retrain the IVF quantizer; runs on the training thread started by `add_embeddings`.
+
+        The rows committed when training starts are sampled and assigned to the new lists while
+        writes and searches continue; rows added meanwhile are assigned under the write lock,
+        where the new files replace the old ones and the result is swapped in.
+        """
+        try:
+            count = self.count
+            matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dim))
+            clusters = max(1, int(4 * np.sqrt(count)))
+            rng = np.random.default_rng(0)
+            sample = np.asarray(matrix[np.sort(rng.choice(count, min(count, clusters * 64), replace=False))])
+            logger.info("Training IVF index with {} lists on {} sampled rows.", clusters, len(sample))
+            centroids = kmeans(sample, clusters)
+            assign = self._assign_rows(centroids, 0, count)
+            with self._write_lock:
+                if self.count > count:
+                    assign = np.concatenate([assign, self._assign_rows(centroids, count, self.count)])
+                temp_path = self._path(IVF_CENTROIDS_FILE) + ".tmp"
+                with open(temp_path, "wb") as f:
+                    np.save(f, centroids)
+                os.replace(temp_path, self._path(IVF_CENTROIDS_FILE))
+                temp_path = self._path(IVF_ASSIGN_FILE) + ".tmp"
+                assign.tofile(temp_path)
+                os.replace(temp_path, self._path(IVF_ASSIGN_FILE))
+                self._centroids, self._assign = centroids, assign
+                self._ivf_trained_at = count
+                self._write_info()
+                self._map()
+        except Exception as e:
+            logger.error("Training the IVF index of {} failed: {}", self.directory, str(e))
+
+    def _assign_rows(self, centroids, start, stop):
+        """Nearest list of each row in `[start, stop)`, a block of rows at a time."""
+        matrix = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(stop, self.dim))
+        return np.concatenate([
+            _nearest_centroid(np.asarray(matrix[block:min(block + SCORE_BLOCK_ROWS, stop)]), centroids)
+            for block in range(start, stop, SCORE_BLOCK_ROWS)
+        ])
+
+    def _read_records(self, rows):
+        records = []
+        with open(self._path(RECORDS_FILE), "rb") as f:
+            for row in rows:
+                f.seek(self._offsets[row])
+                records.append(json.loads(f.readline()))
+        return records
+
+    def _candidates(self, query, centroids, lists):
+        """Rows to score exactly: all rows, or the rows of the closest IVF lists."""
+        if centroids is None:
+            return None
+        order, bounds = lists
+        nprobe = max(self.nprobe, int(np.ceil(self.probe_fraction * len(centroids))))
+        probe = _top_k((centroids ** 2).sum(axis=1) - 2.0 * centroids @ query, nprobe)
+        return np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+
+    def _rescore(self, query, k, rows, matrix, norms):
+        """Exact distances of the shortlisted `rows`, best `k` first."""
+        rows = np.sort(rows)
+        distances = norms[rows] - 2.0 * (matrix[rows] @ query) + query @ query
+        best = _top_k(distances, k)
+        return rows[best], distances[best]
+
+    def _search_rows(self, query, k, view):
+        matrix, norms, centroids, lists, codes, scales = view
+        if len(matrix) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        rows = self._candidates(query, centroids, lists)
+        if codes is not None:
+            # The query norm is the same for every row, so it is left out of the approximate ranking
+            approx = (norms if rows is None else norms[rows]) - 2.0 * _approx_products(codes, scales, query[None, :], rows)[:, 0]
+            shortlist = _top_k(approx, k * self.rescore_factor)
+            return self._rescore(query, k, shortlist if rows is None else rows[shortlist], matrix, norms)
+        if rows is None:
+            distances = norms - 2.0 * (matrix @ query) + query @ query
+            best = _top_k(distances, k)
+            return best, distances[best]
+        return self._rescore(query, k, rows, matrix, norms)
+
+    def _to_results(self, rows, distances):
+        records = self._read_records(rows)
+        return [
+            (record["id"], Document(page_content=record["text"], metadata=record["metadata"]), float(distance))
+            for record, distance in zip(records, distances)
+        ]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        rows, distances = self._search_rows(embedding, k, self._view)
+        return [(document, distance) for _, document, distance in self._to_results(rows, distances)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        """Return the `k` closest records to `query` as `(Document, distance)` pairs."""
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def search_by_vectors(self, vectors, k):
+        """Run one search per query vector. Searches without IVF share a single matrix product."""
+        view = self._view
+        matrix, norms, centroids, _, codes, scales = view
+        if centroids is not None or len(matrix) == 0:
+            return [self._to_results(*self._search_rows(vector, k, view)) for vector in vectors]
+        queries = np.asarray(vectors, dtype=np.float32)
+        if codes is not None:
+            approx = norms[:, None] - 2.0 * _approx_products(codes, scales, queries)
+            return [
+                self._to_results(*self._rescore(query, k, _top_k(approx[:, i], k * self.rescore_factor), matrix, norms))
+                for i, query in enumerate(queries)
+            ]
+        distances = norms[None, :] - 2.0 * (queries @ matrix.T) + (queries ** 2).sum(axis=1)[:, None]
+        results = []
+        for row_distances in distances:
+            best = _top_k(row_distances, k)
+            results.append(self._to_results(best, row_distances[best]))
+        return results
+
+    def get_existing_ids(self, ids):
+        return {record_id for record_id in ids if record_id in self._rows}
+
+    def _matching_rows(self, start, where):
+        """Yield `(row, record)` for the records from row `start` on that match `where`."""
+        count = len(self._view[0])
+        for block in range(start, count, 1000):
+            rows = list(range(block, min(block + 1000, count)))
+            for row, record in zip(rows, self._read_records(rows)):
+                if where and any(record["metadata"].get(key) != value for key, value in where.items()):
+                    continue
+                yield row, record
+
+    def _add_item(self, items, row, record, include):
+        items["ids"].append(record["id"])
+        items["documents"].append(record["text"])
+        items["metadatas"].append(record["metadata"])
+        if "embeddings" in include:
+            items["embeddings"].append(np.asarray(self._view[0][row]).tolist())
+
+    def get_records(self, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+        """Return records in insertion order, in the same shape as a Chroma collection `get`."""
+        items = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        for skipped, (row, record) in enumerate(self._matching_rows(0, where)):
+            if skipped < offset:
+                continue
+            self._add_item(items, row, record, include)
+            if limit is not None and len(items["ids"]) >= limit:
+                break
+        return items
+
+    def get_records_after(self, after=None, limit=100, where=None, include=("documents", "metadatas")):
+        """
+        Return up to `limit` records after row `after` and the row of the last one.
+
+        See `app.utils.vector_store.get_records_after`; positions are row numbers.
+        """
+        items = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        for row, record in self._matching_rows(0 if after is None else after + 1, where):
+            self._add_item(items, row, record, include)
+            if len(items["ids"]) >= limit:
+                return items, row
+        return items, None
+
+    def wait_for_training(self, timeout=None):
+        """Wait until a running IVF retraining has been swapped in."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def close(self):
+        self.wait_for_training()
+        self._view = None
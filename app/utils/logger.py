@@ -1,28 +1,245 @@
 from loguru import logger
+import atexit
+import glob
+import json
+import queue
 import sys
 import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from app.core.config import (
+    LOG_DIR,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_MAX_FIELD_CHARS,
+    LOG_SAMPLE_BURST,
+    LOG_SAMPLE_EVERY,
+    LOG_QUEUE_MAX,
+)
+from app.utils.metrics import metrics
 
-# Log directory setup
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Log file path
+# Log file path; the directory is created when the first record is written
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_RETENTION_SECONDS = 7 * 24 * 3600
+
+TEXT_FORMATS = {
+    "stderr": "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+    "file": "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+}
+# Levels below this one are sampled; warnings and errors are always kept
+SAMPLED_BELOW_LEVEL = logger.level("WARNING").no
+
+LOG_DROPPED = metrics.counter("rag_log_records_dropped_total", "Log records dropped because the log writer fell behind.")
+
+def truncate(value, limit=LOG_MAX_FIELD_CHARS):
+    """Cut a string to `limit` characters, noting how much was dropped."""
+    if limit <= 0 or len(value) <= limit:
+        return value
+    return f"{value[:limit]}... [{len(value) - limit} more chars]"
+
+class CallSiteSampler:
+    """
+    Thins out high-volume records per call site.
+
+    The first `burst` records of each one-second window from a call site are kept; after that
+    only every `every`-th one is, and it carries the number of records dropped before it in
+    its `sampled_out` field, so the volume can still be read from the logs.
+    """
+
+    def __init__(self, burst=LOG_SAMPLE_BURST, every=LOG_SAMPLE_EVERY):
+        self.burst = burst
+        self.every = max(1, every)
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def keep(self, record):
+        """
+        Decide whether `record` is written.
+
+        Returns:
+            tuple[bool, int]: Whether to keep it and, if kept, how many records of its call site were dropped before it.
+        """
+        if self.burst <= 0 or record["level"].no >= SAMPLED_BELOW_LEVEL:
+            return True, 0
+        key = (record["name"], record["line"])
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                window = self._windows[key] = [now, 0, window[2] if window else 0]
+            window[1] += 1
+            if window[1] <= self.burst or (window[1] - self.burst) % self.every == 0:
+                dropped, window[2] = window[2], 0
+                return True, dropped
+            window[2] += 1
+            return False, 0
+
+class RotatingFile:
+    """Append-only log file, rotated at `max_bytes` like loguru's `rotation`, with rotated files removed after `retention` seconds."""
+
+    def __init__(self, path, max_bytes=LOG_FILE_MAX_BYTES, retention=LOG_FILE_RETENTION_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self._file = None
+
+    def write(self, text):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() and self._file.tell() + len(text) > self.max_bytes:
+            self._rotate()
+        self._file.write(text)
+
+    def _rotate(self):
+        self._file.close()
+        root, extension = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{datetime.now():%Y-%m-%d_%H-%M-%S_%f}{extension}")
+        cutoff = time.time() - self.retention
+        for rotated in glob.glob(f"{root}.*{extension}"):
+            if os.path.getmtime(rotated) < cutoff:
+                os.remove(rotated)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BackgroundLogWriter:
+    """
+    Writes formatted log records to their targets on a background thread.
+
+    Each loguru sink created with `sink` only puts the formatted record on an in-process queue,
+    so a logging call never waits for stderr or the disk. The writer thread takes everything
+    queued at once and flushes each target once per batch. When `max_queue` records are already
+    waiting, new records are dropped and counted instead of growing memory or blocking callers.
+    """
+
+    def __init__(self, max_queue=LOG_QUEUE_MAX):
+        self.max_queue = max_queue
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def sink(self, target):
+        """Loguru sink that hands records to this writer for `target`, an object with `write` and `flush`."""
+        def enqueue(message):
+            if self._queue.qsize() >= self.max_queue:
+                LOG_DROPPED.inc()
+                return
+            self._queue.put((target, message))
+        return enqueue
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            touched = []
+            for target, message in batch:
+                if target is None:
+                    # Flush marker, see `flush`
+                    message.set()
+                    continue
+                try:
+                    target.write(message)
+                except Exception as e:
+                    sys.__stderr__.write(f"Log writer failed: {e}\n")
+                if target not in touched:
+                    touched.append(target)
+            for target in touched:
+                try:
+                    target.flush()
+                except Exception:
+                    pass
+
+    def flush(self, timeout=5.0):
+        """Wait until every record queued so far is written."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait(timeout)
+
+sampler = CallSiteSampler()
+log_writer = BackgroundLogWriter()
+log_file = RotatingFile(LOG_FILE)
+
+def _patch(record):
+    """Sample, then cap the message and context fields; runs once per record, before any sink."""
+    keep, dropped = sampler.keep(record)
+    extra = record["extra"]
+    if not keep:
+        extra["_dropped"] = True
+        return
+    if dropped:
+        extra["sampled_out"] = dropped
+    record["message"] = truncate(record["message"])
+    for key, value in extra.items():
+        if isinstance(value, str):
+            extra[key] = truncate(value)
+
+def _keep(record):
+    return "_dropped" not in record["extra"]
+
+def _json_format(record):
+    """One JSON object per record; it is built once and shared by both sinks."""
+    extra = record["extra"]
+    if "_json" not in extra:
+        entry = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "logger": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+        }
+        entry.update((key, value) for key, value in extra.items() if not key.startswith("_"))
+        if record["exception"] is not None:
+            error_type, error, error_traceback = record["exception"]
+            entry["exception"] = "".join(traceback.format_exception(error_type, error, error_traceback))
+        extra["_json"] = json.dumps(entry, default=str)
+    return "{extra[_json]}\n"
+
+def _close():
+    log_writer.flush()
+    log_file.close()
 
-# Configure Loguru
+# Configure Loguru: records are formatted by the caller and written by the log writer thread
 logger.remove()  # Remove default handler
+logger.configure(patcher=_patch)
 logger.add(
-    sys.stderr,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO",
+    log_writer.sink(sys.stderr),
+    format=_json_format if LOG_FORMAT == "json" else TEXT_FORMATS["stderr"],
+    level=LOG_LEVEL,
+    filter=_keep,
+    colorize=LOG_FORMAT != "json" and sys.stderr.isatty(),
 )
 logger.add(
-    LOG_FILE,
-    rotation="10 MB",
-    retention="7 days",
-    level="INFO",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+    log_writer.sink(log_file),
+    format=_json_format if LOG_FORMAT == "json" else TEXT_FORMATS["file"],
+    level=LOG_LEVEL,
+    filter=_keep,
 )
+log_writer.start()
+atexit.register(_close)
 
 # Helper for structured logging
 def log_request_details(endpoint: str, query_params: dict = None, body: dict = None):
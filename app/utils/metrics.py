@@ -0,0 +1,206 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from app.core.config import TRACE_EXPORT_ENDPOINT, TRACE_SERVICE_NAME
+from loguru import logger
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(10))  # 1 KiB .. 256 MiB
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    type_name = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(self._values.items())]
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text format."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide collection of metrics exposed by the `/metrics` endpoint."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name, description):
+        return self._get_or_create(name, lambda: Counter(name, description))
+
+    def histogram(self, name, description, buckets=DURATION_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(name, description, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram("rag_stage_duration_seconds", "Duration of one processing stage.")
+REQUEST_SECONDS = metrics.histogram("rag_http_request_duration_seconds", "Duration of HTTP requests until the response headers.")
+TOKENS = metrics.counter("rag_tokens_total", "Tokens sent to or received from OpenAI models.")
+PAYLOAD_BYTES = metrics.histogram("rag_payload_size_bytes", "Size of uploads, LLM contexts and responses.", SIZE_BUCKETS)
+
+# Stage timings of the current request or ingestion job, see `collect_timings`
+_timings = contextvars.ContextVar("timings", default=None)
+_tracer = None
+_tracer_provider = None
+
+@contextmanager
+def collect_timings():
+    """
+    Collect the durations of every `timed` stage run in this context.
+
+    Yields:
+        dict[str, float]: Seconds per stage, summed when a stage runs more than once.
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def span(name, **attributes):
+    """Start a trace span when span export is enabled; otherwise a no-op context manager."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+@contextmanager
+def timed(operation, stage):
+    """
+    Time one stage of `operation`.
+
+    The duration goes into the `rag_stage_duration_seconds` histogram, into the timings of the
+    enclosing `collect_timings` block (which feed the Server-Timing header) and, when span
+    export is enabled, into a span named `operation.stage`.
+    """
+    started = time.perf_counter()
+    try:
+        with span(f"{operation}.{stage}"):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, operation=operation, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def record_tokens(kind, count, **labels):
+    """Count `count` tokens of `kind`: 'embedding', 'prompt' or 'completion'."""
+    if count:
+        TOKENS.inc(count, kind=kind, **labels)
+
+def record_payload(kind, size):
+    """Record the size in bytes of an upload, LLM context or response."""
+    if size is not None:
+        PAYLOAD_BYTES.observe(size, kind=kind)
+
+def server_timing_header(timings, total=None):
+    """Format stage timings, in seconds, as a Server-Timing header value in milliseconds."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+def init_tracing(endpoint=TRACE_EXPORT_ENDPOINT, service_name=TRACE_SERVICE_NAME):
+    """
+    Export spans to an OTLP collector at `endpoint`, e.g. 'http://localhost:4317'.
+
+    Span export is optional: nothing happens when `endpoint` is empty, and a warning is
+    logged when the OpenTelemetry SDK and OTLP exporter are not installed.
+    """
+    global _tracer, _tracer_provider
+    if not endpoint or _tracer is not None:
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning("Span export disabled, OpenTelemetry is not installed: {}", e)
+        return
+    _tracer_provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint, insecure=True)))
+    _tracer = _tracer_provider.get_tracer("rag")
+    logger.info("Exporting spans to {}.", endpoint)
+
+def shutdown_tracing():
+    """Flush pending spans and stop exporting."""
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+    _tracer = None
+    _tracer_provider = None
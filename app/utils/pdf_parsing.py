@@ -0,0 +1,156 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.documents import Document
+from app.core.config import PDF_PARSE_WORKERS, PDF_PAGES_PER_TASK, PDF_PARALLEL_MIN_PAGES
+from app.utils.metrics import metrics
+from loguru import logger
+
+PAGE_PARSE_SECONDS = metrics.histogram("rag_pdf_page_parse_seconds", "Text extraction time of one PDF page.")
+PAGE_FAILURES = metrics.counter("rag_pdf_page_failures_total", "PDF pages whose text could not be extracted.")
+
+def count_pages(path):
+    """Number of pages in the PDF at `path`."""
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def _iter_page_texts(path, start, end):
+    """
+    Extract pages `start` to `end - 1` one at a time.
+
+    Each page is extracted with pypdf; pages pypdf cannot read are retried with pdfplumber.
+    A page that fails with both is reported with empty text instead of failing the document.
+
+    Yields:
+        dict: `page`, `text`, `seconds` and `error` (None on success) of each page.
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    plumber = None
+    try:
+        for number in range(start, end):
+            started = time.perf_counter()
+            text, error = "", None
+            try:
+                text = reader.pages[number].extract_text()
+            except Exception as e:
+                error = f"pypdf: {e}"
+                try:
+                    if plumber is None:
+                        import pdfplumber
+                        plumber = pdfplumber.open(path)
+                    text = plumber.pages[number].extract_text() or ""
+                    error = None
+                except Exception as fallback_error:
+                    error += f"; pdfplumber: {fallback_error}"
+            yield {"page": number, "text": text, "seconds": time.perf_counter() - started, "error": error}
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+def extract_page_range(path, start, end):
+    """Extract a range of pages; the task run by the worker processes. See `_iter_page_texts`."""
+    return list(_iter_page_texts(path, start, end))
+
+class ParallelPdfParser:
+    """
+    Extracts the text of large PDFs in a pool of worker processes, one range of pages per task.
+
+    Each worker opens the file itself, so only page numbers and extracted text cross process
+    boundaries. At most `2 * workers` ranges are in flight and pages are yielded in page order,
+    so memory stays bounded while every core is parsing. PDFs below `min_pages` pages, or any
+    PDF when only one worker is configured, are parsed lazily in the calling process.
+    A range whose task fails (e.g. a crashed worker) is parsed again in the calling process.
+    """
+
+    def __init__(self, workers=PDF_PARSE_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, min_pages=PDF_PARALLEL_MIN_PAGES):
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.min_pages = min_pages
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned workers do not inherit the server's threads and locks
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_parallel(self, path, total):
+        ranges = deque((start, min(start + self.pages_per_task, total)) for start in range(0, total, self.pages_per_task))
+        pending = deque()
+        pool = self._get_pool()
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < self.workers * 2:
+                    start, end = ranges.popleft()
+                    pending.append((start, end, pool.submit(extract_page_range, path, start, end)))
+                start, end, future = pending.popleft()
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    logger.warning("Parsing pages {}-{} in a worker failed, parsing them in-process: {}", start, end - 1, e)
+                    if isinstance(e, BrokenProcessPool):
+                        self._reset_pool(pool)
+                        pool = self._get_pool()
+                    pages = extract_page_range(path, start, end)
+                yield from pages
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+    def iter_pages(self, path, filename):
+        """
+        Parse the PDF at `path` into one document per page, in page order.
+
+        Page metadata holds `source`, `page`, `parse_seconds` and, for pages whose text could
+        not be extracted, `parse_error`.
+
+        Returns:
+            Iterator[Document]: Pages, parsed as they are consumed.
+        """
+        total = count_pages(path)
+        parallel = self.workers > 1 and total >= self.min_pages
+        results = self._iter_parallel(path, total) if parallel else _iter_page_texts(path, 0, total)
+
+        def pages():
+            failed = 0
+            slowest = None
+            for result in results:
+                PAGE_PARSE_SECONDS.observe(result["seconds"])
+                if slowest is None or result["seconds"] > slowest["seconds"]:
+                    slowest = result
+                metadata = {"source": filename, "page": result["page"], "parse_seconds": result["seconds"]}
+                if result["error"]:
+                    failed += 1
+                    PAGE_FAILURES.inc()
+                    metadata["parse_error"] = result["error"]
+                    logger.warning("Could not extract page {} of '{}': {}", result["page"], filename, result["error"])
+                yield Document(page_content=result["text"], metadata=metadata)
+            if slowest is not None:
+                logger.info(
+                    "Parsed {} pages of '{}' {}, {} failed, slowest page {} took {:.3f}s.",
+                    total, filename, f"in {self.workers} processes" if parallel else "in-process",
+                    failed, slowest["page"], slowest["seconds"]
+                )
+
+        return pages()
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling queued ranges."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+pdf_parser = ParallelPdfParser()
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_SIMILARITY_THRESHOLD
+from app.utils.embedding_cache import normalize_text
+from loguru import logger
+
+class QueryCache:
+    """
+    TTL cache of complete similarity responses.
+
+    Entries are keyed by `(normalized query, top_n, llm_type, vector_store_type, search_mode)`. When
+    `similarity_threshold` is set, a lookup that misses the exact key also matches a cached
+    query with the same parameters whose embedding has at least that cosine similarity.
+    Entries for a store are dropped whenever its collection changes. Each invalidation also bumps
+    the store's generation: callers take `generation` before computing a response and pass it to
+    `put`, which drops the response if the store changed meanwhile, so an answer computed from
+    the old contents is never cached after the invalidation.
+    """
+
+    def __init__(self, ttl=QUERY_CACHE_TTL_SECONDS, max_entries=QUERY_CACHE_MAX_ENTRIES,
+                 similarity_threshold=QUERY_CACHE_SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        # Invalidation count per store; None counts invalidations of every store
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def near_duplicates_enabled(self):
+        return self.similarity_threshold is not None
+
+    @staticmethod
+    def _key(query, top_n, llm_type, vector_store_type, search_mode):
+        return (normalize_text(query), top_n, llm_type, vector_store_type, search_mode)
+
+    def generation(self, vector_store_type):
+        """Current generation of a store's entries, to pass to `put`."""
+        with self._lock:
+            return self._generations.get(vector_store_type, 0), self._generations.get(None, 0)
+
+    def get(self, query, top_n, llm_type, vector_store_type, embedding=None, search_mode="vector"):
+        """
+        Return the cached response for the query, or None.
+
+        Args:
+            embedding (list[float], optional): Query embedding, used for near-duplicate matching.
+        """
+        key = self._key(query, top_n, llm_type, vector_store_type, search_mode)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["response"]
+            if entry is not None:
+                del self._entries[key]
+
+            if embedding is not None and self.near_duplicates_enabled:
+                match = self._nearest(key[1:], np.asarray(embedding, dtype=np.float32), now)
+                if match is not None:
+                    self.near_hits += 1
+                    return match["response"]
+
+            self.misses += 1
+            return None
+
+    def _nearest(self, params, embedding, now):
+        candidates = [
+            entry for key, entry in self._entries.items()
+            if key[1:] == params and entry["embedding"] is not None and entry["expires_at"] > now
+        ]
+        if not candidates:
+            return None
+        matrix = np.stack([entry["embedding"] for entry in candidates])
+        scores = matrix @ (embedding / (np.linalg.norm(embedding) or 1.0))
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity_threshold else None
+
+    def put(self, query, top_n, llm_type, vector_store_type, response, embedding=None, search_mode="vector",
+            generation=None):
+        """
+        Cache `response` for the query.
+
+        Args:
+            generation (tuple, optional): `generation(vector_store_type)` taken before the response was
+                computed; the response is not cached if the store was invalidated since.
+        """
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        key = self._key(query, top_n, llm_type, vector_store_type, search_mode)
+        with self._lock:
+            if generation is not None and generation != (
+                self._generations.get(vector_store_type, 0), self._generations.get(None, 0)
+            ):
+                logger.debug("Not caching a response computed before store '{}' changed.", vector_store_type)
+                return
+            self._entries[key] = {
+                "response": response,
+                "embedding": embedding,
+                "expires_at": time.time() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, vector_store_type=None):
+        """Drop cached responses for one store, or for all stores if none is given."""
+        with self._lock:
+            stale = [key for key in self._entries if vector_store_type is None or key[3] == vector_store_type]
+            for key in stale:
+                del self._entries[key]
+            self._generations[vector_store_type] = self._generations.get(vector_store_type, 0) + 1
+            self.invalidations += 1
+        logger.info("Query cache invalidated for store '{}': {} entries dropped.", vector_store_type or "*", len(stale))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+query_cache = QueryCache()
@@ -0,0 +1,462 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from app.core.config import (
+    DATABASE_DIR,
+    SNAPSHOT_PAGES_PER_STEP,
+    LOCAL_STORE_DIR,
+    LEXICAL_INDEX_DIR,
+    PUBLISH_DIR,
+    PUBLISH_KEEP,
+    PUBLISH_INTERVAL_SECONDS,
+    READER_POLL_SECONDS,
+    READER_WORK_DIR,
+)
+from app.utils.async_store import store_writes
+from app.utils.lexical_index import LexicalIndex
+from app.utils.local_store import (
+    LocalVectorStore,
+    write_lock,
+    INFO_FILE,
+    VECTORS_FILE,
+    NORMS_FILE,
+    RECORDS_FILE,
+    IDS_FILE,
+    OFFSETS_FILE,
+    SCALES_FILE,
+    CODES_FILES,
+    IVF_CENTROIDS_FILE,
+    IVF_ASSIGN_FILE,
+)
+from app.utils.metrics import timed
+from app.utils.query_cache import query_cache
+from app.utils.vector_store import open_chroma, close_chroma
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows has no reflinks; files are copied
+    fcntl = None
+
+CURRENT_NAME = "CURRENT.json"
+CHROMA_DB_NAME = "chroma.sqlite3"
+# Local store files that are only ever appended to; readers stop at the committed count, so a
+# version can hard-link them. The small info and IVF files are replaced as a whole and are copied.
+LOCAL_APPEND_ONLY_FILES = (VECTORS_FILE, NORMS_FILE, RECORDS_FILE, IDS_FILE, OFFSETS_FILE, SCALES_FILE) + tuple(CODES_FILES.values())
+LOCAL_COPIED_FILES = (INFO_FILE, IVF_CENTROIDS_FILE, IVF_ASSIGN_FILE)
+# Copies of Chroma taken while writes continue, before it is copied with writes held instead
+CHROMA_COPY_ATTEMPTS = 3
+# ioctl that makes a file a copy-on-write clone of another (Linux FICLONE)
+FICLONE = 0x40049409
+
+def _backup_sqlite(source_conn, target, pages=-1):
+    """Copy the database of `source_conn` to `target` with the online backup API."""
+    target_conn = sqlite3.connect(target)
+    try:
+        source_conn.backup(target_conn, pages=pages, sleep=0.001)
+        # Readers open the copy read-only, which needs a rollback journal rather than WAL
+        target_conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target_conn.close()
+
+def _link_or_copy(source, target):
+    """Hard-link `source` as `target`, or copy it where the file system has no links."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def _clone_file(source, target):
+    """
+    Copy `source` to `target` as a copy-on-write clone where the file system supports reflinks
+    (e.g. Btrfs, XFS), so the copy shares its blocks until either file is written; otherwise
+    the data is copied. Metadata is copied like `shutil.copy2`.
+    """
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as source_file, open(target, "wb") as target_file:
+                fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+            shutil.copystat(source, target)
+            return target
+        except OSError:
+            pass
+    return shutil.copy2(source, target)
+
+def _same_file(path, other):
+    """True if `other` exists with the size and modification time of `path`, as `shutil.copy2` leaves it."""
+    if not os.path.exists(other):
+        return False
+    stat, other_stat = os.stat(path), os.stat(other)
+    return stat.st_size == other_stat.st_size and stat.st_mtime_ns == other_stat.st_mtime_ns
+
+def _data_version(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def read_current(publish_dir=PUBLISH_DIR):
+    """
+    Return the entry of the newest published version, or None if nothing was published yet.
+
+    Returns:
+        dict or None: `version`, `dir` (relative to `publish_dir`), `stores` and `created_at`.
+    """
+    path = os.path.join(publish_dir, CURRENT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+class VersionPublisher:
+    """
+    Publishes read-only versions of the vector stores for reader processes; runs in the writer.
+
+    A version is a directory under `publish_dir` with a copy of the Chroma database, the local
+    store and the lexical indexes in which no write is half-applied. Writes are held only for
+    the point the copy is taken at, not for the copying: the append-only local store files are
+    hard-linked, Chroma segment files unchanged since the previous version are linked from it,
+    and the sqlite databases are copied while writes continue. Once complete, a version becomes
+    current by atomically replacing `CURRENT.json`. A new version
+    is published when writes were recorded and at least `interval` seconds have passed since
+    the last one, so a burst of uploads is published once. The newest `keep` versions are kept,
+    which leaves readers several poll intervals to move off a version before it is removed.
+    """
+
+    def __init__(self, publish_dir=PUBLISH_DIR, keep=PUBLISH_KEEP, interval=PUBLISH_INTERVAL_SECONDS):
+        self.publish_dir = publish_dir
+        self.keep = max(1, keep)
+        self.interval = interval
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def record_writes(self, count):
+        """Note that `count` records were written, so a new version is due."""
+        if not count:
+            return
+        with self._lock:
+            self._pending_writes += count
+        self._wake.set()
+
+    def _skipped_dirs(self):
+        return {os.path.abspath(path) for path in (LOCAL_STORE_DIR, LEXICAL_INDEX_DIR, self.publish_dir)}
+
+    def _copy_chroma_files(self, target, previous):
+        """
+        Copy the Chroma directory apart from its sqlite database.
+
+        Files that match their copy in the `previous` version are hard-linked from it instead,
+        so only the segment files changed since the last version are copied.
+        """
+        skipped = self._skipped_dirs()
+        for root, dirs, files in os.walk(DATABASE_DIR):
+            dirs[:] = [name for name in dirs if os.path.abspath(os.path.join(root, name)) not in skipped]
+            relative = os.path.relpath(root, DATABASE_DIR)
+            os.makedirs(os.path.join(target, relative), exist_ok=True)
+            for name in files:
+                if name.startswith(CHROMA_DB_NAME):
+                    continue
+                source = os.path.join(root, name)
+                earlier = os.path.join(previous, relative, name) if previous else None
+                if earlier and _same_file(source, earlier):
+                    _link_or_copy(earlier, os.path.join(target, relative, name))
+                else:
+                    _clone_file(source, os.path.join(target, relative, name))
+
+    def _copy_chroma(self, target, previous):
+        """
+        Copy the Chroma directory consistently without holding writes for the whole copy.
+
+        The files and the database are copied while writes continue. Then, with writes held,
+        sqlite's `data_version` tells whether anything was committed to Chroma meanwhile; every
+        Chroma write, including the persisting of its segment files, commits. If so the copy is
+        retried, and after `CHROMA_COPY_ATTEMPTS` it is taken with writes held instead.
+        """
+        db_file = os.path.join(DATABASE_DIR, CHROMA_DB_NAME)
+        watch = sqlite3.connect(db_file, check_same_thread=False)
+        try:
+            for _ in range(CHROMA_COPY_ATTEMPTS):
+                version = _data_version(watch)
+                shutil.rmtree(target, ignore_errors=True)
+                self._copy_chroma_files(target, previous)
+                # Paged like the snapshots, so Chroma's own writes are never blocked for long
+                _backup_sqlite(watch, os.path.join(target, CHROMA_DB_NAME), pages=SNAPSHOT_PAGES_PER_STEP)
+                if store_writes.call(lambda: _data_version(watch) == version):
+                    return
+            logger.info("Chroma changed during {} copies, copying it with writes held.", CHROMA_COPY_ATTEMPTS)
+
+            def copy_held():
+                shutil.rmtree(target, ignore_errors=True)
+                self._copy_chroma_files(target, previous)
+                _backup_sqlite(watch, os.path.join(target, CHROMA_DB_NAME))
+            store_writes.call(copy_held)
+        finally:
+            watch.close()
+
+    def _snapshot_point(self, target, stores):
+        """
+        Fix the local store and lexical index contents of a version; runs with writes held.
+
+        The local store files are hard-linked and only its small info and IVF files are copied.
+        Each lexical index gets a connection holding a read transaction, which keeps its view at
+        this point while it is copied after writes resume; the indexes use WAL, so holding it
+        blocks no writer.
+
+        Returns:
+            dict: Pinned connection of each lexical index, by store type.
+        """
+        if "local" in stores:
+            local_dir = os.path.join(target, "local")
+            os.makedirs(local_dir)
+            # IVF retraining swaps its files in from its own thread, under the store's write lock
+            with write_lock(LOCAL_STORE_DIR):
+                for name in LOCAL_APPEND_ONLY_FILES + LOCAL_COPIED_FILES:
+                    source = os.path.join(LOCAL_STORE_DIR, name)
+                    if not os.path.exists(source):
+                        continue
+                    if name in LOCAL_COPIED_FILES:
+                        shutil.copy2(source, os.path.join(local_dir, name))
+                    else:
+                        _link_or_copy(source, os.path.join(local_dir, name))
+        pinned = {}
+        for store_type in stores:
+            index_path = os.path.join(LEXICAL_INDEX_DIR, f"{store_type}.sqlite3")
+            if os.path.exists(index_path):
+                conn = sqlite3.connect(index_path, isolation_level=None, check_same_thread=False)
+                conn.execute("BEGIN")
+                conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+                pinned[store_type] = conn
+        return pinned
+
+    def publish(self):
+        """
+        Publish a version now.
+
+        Only short steps run on the store write pool, see `_copy_chroma` and `_snapshot_point`;
+        the bulk of the copying runs while writes continue.
+
+        Returns:
+            dict or None: The new `CURRENT.json` entry, or None if there is no store to publish.
+        """
+        stores = []
+        if os.path.exists(os.path.join(DATABASE_DIR, CHROMA_DB_NAME)):
+            stores.append("chroma")
+        if os.path.exists(os.path.join(LOCAL_STORE_DIR, INFO_FILE)):
+            stores.append("local")
+        if not stores:
+            return None
+
+        started = time.time()
+        current = read_current(self.publish_dir)
+        version = max(int(started * 1000), current["version"] + 1 if current else 0)
+        name = f"v{version}"
+        version_dir = os.path.join(self.publish_dir, name)
+        temp_dir = version_dir + ".tmp"
+        previous_chroma = os.path.join(self.publish_dir, current["dir"], "chroma") if current else None
+        pinned = {}
+        try:
+            with timed("publish", "copy"):
+                os.makedirs(temp_dir)
+                if "chroma" in stores:
+                    self._copy_chroma(os.path.join(temp_dir, "chroma"), previous_chroma)
+                pinned = store_writes.call(self._snapshot_point, temp_dir, stores)
+                for store_type, conn in pinned.items():
+                    os.makedirs(os.path.join(temp_dir, "lexical"), exist_ok=True)
+                    _backup_sqlite(conn, os.path.join(temp_dir, "lexical", f"{store_type}.sqlite3"))
+                os.replace(temp_dir, version_dir)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        finally:
+            for conn in pinned.values():
+                conn.close()
+
+        entry = {"version": version, "dir": name, "stores": stores, "created_at": started}
+        temp_path = os.path.join(self.publish_dir, CURRENT_NAME + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, os.path.join(self.publish_dir, CURRENT_NAME))
+
+        versions = sorted(
+            (d for d in os.listdir(self.publish_dir) if d.startswith("v") and d[1:].isdigit()),
+            key=lambda d: int(d[1:]), reverse=True
+        )
+        for old in versions[self.keep:]:
+            shutil.rmtree(os.path.join(self.publish_dir, old), ignore_errors=True)
+        logger.info("Published vector store version {} ({}) in {:.3f}s.", name, ", ".join(stores), time.time() - started)
+        return entry
+
+    def _publish_pending(self):
+        with self._lock:
+            writes, self._pending_writes = self._pending_writes, 0
+        try:
+            return self.publish()
+        except Exception:
+            with self._lock:
+                self._pending_writes += writes
+            raise
+
+    def _run(self):
+        last_publish = 0.0
+        while not self._stopping:
+            if not self._pending_writes:
+                self._wake.wait()
+            elif (remaining := self.interval - (time.time() - last_publish)) > 0:
+                self._wake.wait(timeout=remaining)
+            self._wake.clear()
+            if self._stopping:
+                break
+            if not self._pending_writes or time.time() - last_publish < self.interval:
+                continue
+            try:
+                self._publish_pending()
+            except Exception as e:
+                logger.error("Publishing a vector store version failed: {}", str(e))
+            last_publish = time.time()
+
+    def start(self):
+        """Start the background publisher; publishes at once if no version exists yet."""
+        if self._thread is not None:
+            return
+        if read_current(self.publish_dir) is None:
+            self._pending_writes = max(self._pending_writes, 1)
+        os.makedirs(self.publish_dir, exist_ok=True)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, publishing writes that are still pending."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        if self._pending_writes:
+            try:
+                self._publish_pending()
+            except Exception as e:
+                logger.error("Final vector store publish failed: {}", str(e))
+
+class VersionWatcher:
+    """
+    Keeps a reader process on the newest published version; runs in the readers.
+
+    Every `poll_interval` seconds `CURRENT.json` is checked. A new version is opened next to
+    the current one and then swapped into the registry in one step, so requests never see a
+    mix of versions and no restart is needed. The local store and the lexical indexes are
+    opened in the published directory with their read-only modes, which never write to it, so
+    every reader shares their pages through the OS page cache. Chroma cannot be shared that way:
+    it replays its log into the HNSW segment files and rewrites them in place when it closes,
+    even when only reading, so each reader opens a private copy in `work_dir`. The copy is made
+    of copy-on-write clones where the file system supports them, so readers share the blocks
+    of a version and only the pages Chroma rewrites are duplicated. A version is closed one swap
+    after it was replaced, once the requests that were using it have finished.
+    """
+
+    def __init__(self, publish_dir=PUBLISH_DIR, poll_interval=READER_POLL_SECONDS, work_dir=READER_WORK_DIR):
+        self.publish_dir = publish_dir
+        self.poll_interval = poll_interval
+        self.work_dir = work_dir
+        self.version = None
+        self._registry = None
+        self._retired = []
+        self._private_dirs = []
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _open(self, entry):
+        version_dir = os.path.join(self.publish_dir, entry["dir"])
+        embeddings = self._registry.get_embeddings()
+        stores, indexes, private_dirs = {}, {}, []
+        if "chroma" in entry["stores"]:
+            private_dir = os.path.join(self.work_dir, entry["dir"])
+            shutil.rmtree(private_dir, ignore_errors=True)
+            shutil.copytree(os.path.join(version_dir, "chroma"), private_dir, copy_function=_clone_file)
+            private_dirs.append(private_dir)
+            stores["chroma"] = open_chroma(private_dir, embeddings)
+        if "local" in entry["stores"]:
+            stores["local"] = LocalVectorStore(os.path.join(version_dir, "local"), embeddings, read_only=True)
+        for store_type in stores:
+            index_path = os.path.join(version_dir, "lexical", f"{store_type}.sqlite3")
+            if os.path.exists(index_path):
+                indexes[store_type] = LexicalIndex(index_path, read_only=True)
+        return stores, indexes, private_dirs
+
+    @staticmethod
+    def _close(stores, indexes, private_dirs):
+        for index in indexes.values():
+            index.close()
+        if "local" in stores:
+            stores["local"].close()
+        for private_dir in private_dirs:
+            close_chroma(private_dir)
+            shutil.rmtree(private_dir, ignore_errors=True)
+
+    def poll(self):
+        """
+        Switch to the newest published version if it changed.
+
+        Returns:
+            bool: True if a new version was installed.
+        """
+        entry = read_current(self.publish_dir)
+        if entry is None or entry["version"] == self.version:
+            return False
+        started = time.time()
+        stores, indexes, private_dirs = self._open(entry)
+        old_stores, old_indexes = self._registry.install_version(entry["version"], stores, indexes)
+        # Cached answers were built from the replaced version
+        query_cache.invalidate()
+        # Close the version replaced one swap ago; the one just replaced may still serve requests
+        for retired in self._retired[:-1]:
+            self._close(*retired)
+        self._retired = self._retired[-1:] + [(old_stores, old_indexes, self._private_dirs)]
+        self._private_dirs = private_dirs
+        self.version = entry["version"]
+        logger.info("Switched to vector store version {} in {:.3f}s.", entry["dir"], time.time() - started)
+        return True
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error("Loading the published vector store version failed: {}", str(e))
+
+    def start(self, registry):
+        """Install the current version, if any, and start watching for new ones."""
+        if self._thread is not None:
+            return
+        self._registry = registry
+        if not self.work_dir:
+            self.work_dir = tempfile.mkdtemp(prefix="rag-reader-")
+        os.makedirs(self.work_dir, exist_ok=True)
+        try:
+            if not self.poll():
+                logger.warning("No published vector store version in {} yet; waiting for the writer.", self.publish_dir)
+        except Exception as e:
+            logger.error("Loading the published vector store version failed: {}", str(e))
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="version-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching and close every version this reader opened."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        for retired in self._retired:
+            self._close(*retired)
+        self._retired = []
+        for private_dir in self._private_dirs:
+            shutil.rmtree(private_dir, ignore_errors=True)
+
+version_publisher = VersionPublisher()
+version_watcher = VersionWatcher()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from app.core.config import (
+    DATABASE_DIR,
+    SNAPSHOT_DIR,
+    SNAPSHOT_KEEP,
+    SNAPSHOT_INTERVAL_SECONDS,
+    SNAPSHOT_WRITE_THRESHOLD,
+    SNAPSHOT_PAGES_PER_STEP,
+)
+from app.utils.metrics import timed
+from loguru import logger
+
+MANIFEST_NAME = "manifest.json"
+
+def file_checksum(path):
+    """SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class SnapshotManager:
+    """
+    Takes consistent snapshots of the Chroma sqlite database in the background.
+
+    Snapshots use sqlite's online backup API, copying a bounded number of pages per step
+    so writers are never blocked for long and the copy is never torn. A snapshot is taken
+    when writes were recorded and either `interval` seconds have passed or `write_threshold`
+    writes have accumulated. The newest `keep` snapshots are kept, each with a checksum in
+    `manifest.json`.
+    """
+
+    def __init__(self, db_file, snapshot_dir, keep=SNAPSHOT_KEEP, interval=SNAPSHOT_INTERVAL_SECONDS,
+                 write_threshold=SNAPSHOT_WRITE_THRESHOLD, pages_per_step=SNAPSHOT_PAGES_PER_STEP):
+        self.db_file = db_file
+        self.snapshot_dir = snapshot_dir
+        self.keep = keep
+        self.interval = interval
+        self.write_threshold = write_threshold
+        self.pages_per_step = pages_per_step
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.snapshot_dir, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, entries):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def record_writes(self, count):
+        """Note that `count` records were written; wakes the snapshot thread past the threshold."""
+        with self._lock:
+            self._pending_writes += count
+            if self._pending_writes >= self.write_threshold:
+                self._wake.set()
+
+    def snapshot(self):
+        """
+        Take a snapshot now.
+
+        Returns:
+            dict or None: The manifest entry of the new snapshot, or None if there is no database yet.
+        """
+        if not os.path.exists(self.db_file):
+            return None
+        with self._snapshot_lock:
+            with self._lock:
+                writes = self._pending_writes
+                self._pending_writes = 0
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            started = time.time()
+            name = f"chroma-{time.strftime('%Y%m%d-%H%M%S')}-{int(started * 1000) % 1000:03d}.sqlite3"
+            path = os.path.join(self.snapshot_dir, name)
+            temp_path = path + ".tmp"
+            try:
+                with timed("snapshot", "backup"):
+                    source = sqlite3.connect(self.db_file)
+                    target = sqlite3.connect(temp_path)
+                    try:
+                        source.backup(target, pages=self.pages_per_step, sleep=0.001)
+                    finally:
+                        target.close()
+                        source.close()
+                    os.replace(temp_path, path)
+            except Exception:
+                with self._lock:
+                    self._pending_writes += writes
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+            entry = {
+                "file": name,
+                "sha256": file_checksum(path),
+                "size": os.path.getsize(path),
+                "created_at": started,
+            }
+            entries = [entry] + self._read_manifest()
+            for old in entries[self.keep:]:
+                old_path = os.path.join(self.snapshot_dir, old["file"])
+                if os.path.exists(old_path):
+                    os.unlink(old_path)
+            self._write_manifest(entries[:self.keep])
+            logger.info("Vector store snapshot {} taken in {:.3f}s.", name, time.time() - started)
+            return entry
+
+    def latest_valid(self):
+        """Return the path of the newest snapshot whose checksum matches, or None."""
+        for entry in self._read_manifest():
+            path = os.path.join(self.snapshot_dir, entry["file"])
+            if os.path.exists(path) and file_checksum(path) == entry["sha256"]:
+                return path
+            logger.warning("Skipping missing or corrupt snapshot: {}", path)
+        return None
+
+    def restore_latest(self):
+        """
+        Restore the newest valid snapshot to the database path.
+
+        Returns:
+            str or None: The restored snapshot path, or None if no valid snapshot exists.
+        """
+        path = self.latest_valid()
+        if path is None:
+            return None
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        temp_path = self.db_file + ".restore"
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, self.db_file)
+        logger.info("Vector store restored from snapshot: {}", path)
+        return path
+
+    def _run(self):
+        last_snapshot = time.time()
+        while not self._stopping:
+            self._wake.wait(timeout=max(1.0, self.interval - (time.time() - last_snapshot)))
+            self._wake.clear()
+            if self._stopping:
+                break
+            with self._lock:
+                writes = self._pending_writes
+            due = time.time() - last_snapshot >= self.interval or writes >= self.write_threshold
+            if writes and due:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error("Vector store snapshot failed: {}", str(e))
+                last_snapshot = time.time()
+
+    def start(self):
+        """Start the background snapshot thread."""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, taking a final snapshot if writes are pending."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        if self._pending_writes:
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error("Final vector store snapshot failed: {}", str(e))
+
+snapshot_manager = SnapshotManager(os.path.join(DATABASE_DIR, "chroma.sqlite3"), SNAPSHOT_DIR)
@@ -0,0 +1,37 @@
+from functools import lru_cache
+from loguru import logger
+
+# Rough characters-per-token ratio used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoding(name="cl100k_base"):
+    """
+    Load a tiktoken encoding once per process.
+
+    Returns:
+        Encoding or None: The encoding, or None if it cannot be loaded (e.g. offline).
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Tokenizer '{}' unavailable, estimating token counts from length: {}", name, e)
+        return None
+
+def count_tokens(text):
+    """Count the tokens of `text` with the encoding used by OpenAI models."""
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text, max_tokens):
+    """Return the longest prefix of `text` that fits in `max_tokens` tokens."""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -1,27 +1,55 @@
 import os
 import shutil
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+import sys
+import uuid
+from langchain_core.documents import Document
+from app.core.config import EMBEDDING_MODEL, DATABASE_DIR, BACKUP_DIR, LOCAL_STORE_DIR
+from app.utils.local_store import LocalVectorStore
+from app.utils.snapshot import snapshot_manager
 from loguru import logger
 
-# Define directories for database and backup
-DATABASE_DIR = "app/database"
-BACKUP_DIR = "app/backup"
+# chromadb, langchain_chroma and langchain_openai take seconds to import, so they are imported
+# when the first store or embedding client is created instead of when the app starts
 
-# Ensure necessary directories exist
-os.makedirs(DATABASE_DIR, exist_ok=True)
-os.makedirs(BACKUP_DIR, exist_ok=True)
+# Store types `initialize_vector_store` can open; 'vertexai' and 'mongodb' are not implemented yet
+VECTOR_STORE_TYPES = ("chroma", "local")
+
+def _is_chroma(vectorstore):
+    """True for a Chroma store; a Chroma store can only exist once `langchain_chroma` was imported."""
+    chroma = sys.modules.get("langchain_chroma")
+    return chroma is not None and isinstance(vectorstore, chroma.Chroma)
 
 def get_chroma_db_file():
     """Locate Chroma's database file."""
     return os.path.join(DATABASE_DIR, "chroma.sqlite3")
 
-def initialize_vector_store(store_type="chroma"):
+def create_embeddings(http_client=None):
+    """
+    Create the OpenAI embedding client used by the vector stores.
+
+    Args:
+        http_client (httpx.Client, optional): Pooled HTTP client to reuse across requests.
+
+    Returns:
+        OpenAIEmbeddings: Embedding client.
+    """
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client
+    )
+
+def initialize_vector_store(store_type="chroma", embeddings=None):
     """
     Initialize vector store based on user choice.
 
+    Prefer `app.core.registry.get_vector_store`, which calls this once per store type
+    and shares the result between requests.
+
     Args:
         store_type (str): The type of vector store to use.
+        embeddings (Embeddings, optional): Embedding client to attach. A new one is created if omitted.
 
     Returns:
         vectorstore: Initialized vector store object.
@@ -31,37 +59,208 @@ def initialize_vector_store(store_type="chroma"):
         ValueError: If an invalid vector store type is specified.
     """
     if store_type == "chroma":
+        from langchain_chroma import Chroma
+        if embeddings is None:
+            embeddings = create_embeddings()
+        os.makedirs(DATABASE_DIR, exist_ok=True)
         db_file = get_chroma_db_file()
         
         if os.path.exists(db_file):
             logger.info(f"Database file found in the database folder. Loading from: {db_file}")
             vectorstore = Chroma(
                 persist_directory=DATABASE_DIR,
-                embedding_function=OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
+                embedding_function=embeddings
             )
         else:
+            # Prefer the newest verified snapshot, then the legacy single-file backup
             backup_file = os.path.join(BACKUP_DIR, "chroma.sqlite3")
-            if os.path.exists(backup_file):
+            if snapshot_manager.restore_latest():
+                logger.info("Database file not found in the database folder. Restored from the latest snapshot.")
+            elif os.path.exists(backup_file):
                 logger.info(f"Database file not found in the database folder. Loading from backup: {backup_file}")
                 shutil.copy(backup_file, db_file)
             else:
                 logger.info("Neither database file nor backup found. Creating a new database file.")
-            
+
             vectorstore = Chroma(
                 persist_directory=DATABASE_DIR,
-                embedding_function=OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
+                embedding_function=embeddings
             )
             logger.info(f"New database file created and persisted at: {db_file}")
-
-            # Create a backup
-            shutil.copy(db_file, backup_file)
-            logger.info(f"Database file copied to backup folder: {backup_file}")
         
         return vectorstore
 
+    elif store_type == "local":
+        if embeddings is None:
+            embeddings = create_embeddings()
+        return LocalVectorStore(LOCAL_STORE_DIR, embeddings)
     elif store_type == "vertexai":
         raise NotImplementedError("VertexAI vector store is not implemented yet.")
     elif store_type == "mongodb":
         raise NotImplementedError("MongoDB vector store is not implemented yet.")
     else:
         raise ValueError("Invalid vector store type specified.")
+
+def open_chroma(directory, embeddings):
+    """Open the Chroma database in `directory` as it is, without the snapshot and backup fallbacks."""
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=directory, embedding_function=embeddings)
+
+def close_chroma(directory):
+    """Stop the Chroma client of `directory`, opened with `open_chroma`, and release its files."""
+    from chromadb.api.client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(directory, None)
+    if system is not None:
+        system.stop()
+
+def add_embeddings(vectorstore, texts, vectors, metadatas, ids=None):
+    """
+    Write pre-computed embeddings to a vector store in one bulk operation.
+
+    Args:
+        vectorstore: Vector store returned by `initialize_vector_store`.
+        texts (list[str]): Chunk texts.
+        vectors (list[list[float]]): Embedding for each text.
+        metadatas (list[dict]): Metadata for each text.
+        ids (list[str], optional): Record ids. Random ids are generated if omitted.
+
+    Returns:
+        list[str]: The ids that were written.
+    """
+    if ids is None:
+        ids = [str(uuid.uuid4()) for _ in texts]
+    if not texts:
+        return ids
+    if _is_chroma(vectorstore):
+        vectorstore._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+    else:
+        vectorstore.add_embeddings(texts, vectors, metadatas, ids)
+    return ids
+
+def get_existing_ids(vectorstore, ids):
+    """
+    Return the subset of `ids` that is already stored.
+
+    Args:
+        vectorstore: Vector store returned by `initialize_vector_store`.
+        ids (list[str]): Record ids to look up.
+
+    Returns:
+        set[str]: Ids present in the store.
+    """
+    if not ids:
+        return set()
+    if _is_chroma(vectorstore):
+        return set(vectorstore._collection.get(ids=ids, include=[])["ids"])
+    return set(vectorstore.get_existing_ids(ids))
+
+def count_records(vectorstore):
+    """Number of records in a vector store returned by `initialize_vector_store`."""
+    if _is_chroma(vectorstore):
+        return vectorstore._collection.count()
+    return vectorstore.count
+
+def search_by_vectors(vectorstore, vectors, k):
+    """
+    Run one similarity search per query vector in a single store call.
+
+    Args:
+        vectorstore: Vector store returned by `initialize_vector_store`.
+        vectors (list[list[float]]): Query embeddings.
+        k (int): Number of results per query.
+
+    Returns:
+        list[list[tuple[str, Document, float]]]: For each query, `(id, document, distance)` tuples, closest first.
+    """
+    if not vectors:
+        return []
+    if _is_chroma(vectorstore):
+        response = vectorstore._collection.query(
+            query_embeddings=vectors, n_results=k, include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (record_id, Document(page_content=text, metadata=metadata or {}), distance)
+                for record_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                response["ids"], response["documents"], response["metadatas"], response["distances"]
+            )
+        ]
+    return vectorstore.search_by_vectors(vectors, k)
+
+def get_records(vectorstore, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+    """
+    Read stored records without running a search.
+
+    Args:
+        vectorstore: Vector store returned by `initialize_vector_store`.
+        limit (int, optional): Maximum number of records to return.
+        offset (int): Number of matching records to skip.
+        where (dict, optional): Metadata filter.
+        include (Iterable[str]): Fields to read: documents, metadatas, embeddings.
+
+    Returns:
+        dict: `ids` plus one list per included field, in the shape of a Chroma `get`.
+    """
+    if _is_chroma(vectorstore):
+        return vectorstore._collection.get(limit=limit, offset=offset, where=where, include=list(include))
+    return vectorstore.get_records(limit=limit, offset=offset, where=where, include=include)
+
+def get_records_after(vectorstore, after=None, limit=100, where=None, include=("documents", "metadatas")):
+    """
+    Read the records stored after position `after`, for paging that stays stable during writes.
+
+    Records keep their position in insertion order and new ones are appended after all others,
+    so paging by the position of the last record returned neither skips nor repeats records
+    while writes land, and each page is read through the position index instead of by skipping
+    every earlier record.
+
+    Args:
+        vectorstore: Vector store returned by `initialize_vector_store`.
+        after (int, optional): Position returned with the previous page; None starts at the beginning.
+        limit (int): Maximum number of records to return.
+        where (dict, optional): Metadata filter.
+        include (Iterable[str]): Fields to read: documents, metadatas, embeddings.
+
+    Returns:
+        tuple[dict, int | None]: The records in the shape of a Chroma `get`, and the position of the
+        last one, or None once the end was reached.
+    """
+    if _is_chroma(vectorstore):
+        return _chroma_records_after(vectorstore, after, limit, where, include)
+    return vectorstore.get_records_after(after, limit, where, include)
+
+def _chroma_records_after(vectorstore, after, limit, where, include):
+    """
+    `get_records_after` for Chroma, keyed on the integer row id of its metadata segment.
+
+    Chroma's `get` only pages by offset, so the ids after `after` are looked up in the segment's
+    embeddings table and their fields are then read with `get`.
+    """
+    from chromadb.segment import MetadataReader
+    collection = vectorstore._collection
+    segment = collection._client._manager.get_segment(collection.id, MetadataReader)
+    items = {"ids": [], **{field: [] for field in include}}
+    position = after or 0
+    while True:
+        with segment._db.tx() as cur:
+            rows = cur.execute(
+                "SELECT id, embedding_id FROM embeddings WHERE segment_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (str(segment._id), position, limit),
+            ).fetchall()
+        if not rows:
+            return items, None
+        found = collection.get(ids=[record_id for _, record_id in rows], where=where, include=list(include))
+        index = {record_id: i for i, record_id in enumerate(found["ids"])}
+        for row_id, record_id in rows:
+            position = row_id
+            if record_id not in index:
+                continue
+            items["ids"].append(record_id)
+            for field in include:
+                items[field].append(found[field][index[record_id]])
+            if len(items["ids"]) == limit:
+                return items, position
+        if len(rows) < limit:
+            return items, None
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from app.utils.metrics import metrics
+from loguru import logger
+
+STARTUP_SECONDS = metrics.histogram("rag_startup_seconds", "Duration of the app import and of each warm-up step.")
+
+class WarmUp:
+    """
+    Prepares the stores and clients in the background right after startup.
+
+    The heavy client libraries are imported on first use, so the app starts accepting
+    connections quickly and the readiness probe reports 503 until the warm-up is done. Steps
+    run one after another: plain functions on a worker thread, coroutine functions on the
+    event loop. A step that fails is logged and reported, and whatever it prepares is created
+    on first use instead, so a failed warm-up never keeps the app from becoming ready.
+    """
+
+    def __init__(self):
+        self.status = "starting"
+        self.import_seconds = None
+        self.timings = {}
+        self.errors = {}
+        self._task = None
+        self._stopping = False
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def record_import(self, seconds):
+        """Record how long importing the app took."""
+        self.import_seconds = round(seconds, 3)
+        STARTUP_SECONDS.observe(seconds, step="import")
+
+    def start(self, steps):
+        """Run `steps`, a list of `(name, callable)` pairs, in order on the running event loop."""
+        self.status = "warming_up"
+        self.timings, self.errors = {}, {}
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run(steps))
+
+    async def _run(self, steps):
+        started = time.perf_counter()
+        for name, step in steps:
+            if self._stopping:
+                return
+            step_started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(step):
+                    await step()
+                else:
+                    await asyncio.to_thread(step)
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.warning("Warm-up step '{}' failed, it will be retried on first use: {}", name, str(e))
+            elapsed = time.perf_counter() - step_started
+            self.timings[name] = round(elapsed, 3)
+            STARTUP_SECONDS.observe(elapsed, step=name)
+        self.timings["total"] = round(time.perf_counter() - started, 3)
+        self.status = "ready"
+        logger.info("Warm-up finished in {:.3f}s: {}", self.timings["total"], self.timings)
+
+    def report(self):
+        """
+        Readiness report for the probe endpoint.
+
+        Returns:
+            dict: `status`, `import_seconds`, the seconds taken by each finished warm-up step and any step errors.
+        """
+        return {
+            "status": self.status,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": dict(self.timings),
+            "errors": dict(self.errors),
+        }
+
+    async def stop(self):
+        """Skip the remaining steps and wait for the running one, so shutdown never races it."""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+warmup = WarmUp()
@@ -19,6 +19,12 @@ export const uploadDocument = async (file, vectorStoreType) => {
   return response.data;
 };
 
+// Get the status and progress of an ingestion job
+export const getJobStatus = async (jobId) => {
+  const response = await api.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
 // Perform text similarity search
 export const textSimilarity = async (query, topN, llmType, vectorStoreType) => {
   try {
@@ -44,6 +50,64 @@ export const textSimilarity = async (query, topN, llmType, vectorStoreType) => {
   }
 };
 
+// Read a Server-Sent Events response and call handlers.onDocuments / onToken / onDone as events arrive.
+// Rejects on an error event, or when the stream ends before its done event, e.g. a dropped connection.
+const readEventStream = async (response, handlers) => {
+  if (!response.ok) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let finished = false;
+
+  while (!finished) {
+    const { value, done } = await reader.read();
+    if (done) throw new Error("The response stream ended before it was complete.");
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      rawEvent.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === "documents") handlers.onDocuments?.(payload.retrieved_documents);
+      else if (event === "token") handlers.onToken?.(payload.content);
+      else if (event === "done") {
+        finished = true;
+        handlers.onDone?.(payload);
+      } else if (event === "error") {
+        await reader.cancel();
+        throw new Error(payload.detail);
+      }
+    }
+  }
+  await reader.cancel();
+};
+
+// Perform text similarity search, rendering the answer as it streams in
+export const textSimilarityStream = async (query, topN, llmType, vectorStoreType, handlers) => {
+  const response = await fetch(`${BASE_URL}/text_similarity/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      query: query,
+      top_n: topN,
+      llm_type: llmType,
+      vector_store_type: vectorStoreType,
+    }),
+  });
+  await readEventStream(response, handlers);
+};
 
 // Document Similarity API
 export const documentSimilarity = async (file, topN, llmType, vectorStoreType) => {
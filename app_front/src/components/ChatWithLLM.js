@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { textSimilarity } from "../api/apiService";
+import { textSimilarityStream } from "../api/apiService";
 
 function ChatWithLLM({ messages, setMessages }) {
   const [input, setInput] = useState(""); // User input
@@ -25,43 +25,59 @@ function ChatWithLLM({ messages, setMessages }) {
       ]);
 
       try {
-        // Call text similarity API
-        const response = await textSimilarity(input, topN, llmType, vectorStoreType);
-
-        // Extract LLM response
-        const llmResponse = response?.llm_response || "No response from LLM.";
-
-        // Extract grounding information
+        // Stream the text similarity response so the answer renders as it is generated
         let groundingInfo = "";
-        if (response?.retrieved_documents && response.retrieved_documents.length > 0) {
-          groundingInfo = `\n\n----------\n**Grounding:**`;
-          response.retrieved_documents.forEach((doc, index) => {
-            const source = doc?.metadata?.source || "Unknown Source";
-            const page = doc?.metadata?.page !== undefined ? doc.metadata.page : "N/A";
-            const score = doc?.score !== undefined ? doc.score.toFixed(6) : "N/A";
-
-            groundingInfo += `\n${index + 1}. Source: ${source}, Page: ${page}, Score: ${score}`;
+        let llmResponse = "";
+        let doneMessage = "";
+        const showResponse = () =>
+          setMessages((prevMessages) => {
+            const withoutPending = prevMessages.filter((msg) => msg.type !== "system" && !msg.streaming);
+            return withoutPending.concat({ type: "llm", text: `${llmResponse}${groundingInfo}`, streaming: true });
           });
-        }
 
-        // Remove "LLM is thinking..." and add real response
+        await textSimilarityStream(input, topN, llmType, vectorStoreType, {
+          onDocuments: (documents) => {
+            // Extract grounding information
+            if (documents && documents.length > 0) {
+              groundingInfo = `\n\n----------\n**Grounding:**`;
+              documents.forEach((doc, index) => {
+                const source = doc?.metadata?.source || "Unknown Source";
+                const page = doc?.metadata?.page !== undefined ? doc.metadata.page : "N/A";
+                const score = doc?.score !== undefined ? doc.score.toFixed(6) : "N/A";
+
+                groundingInfo += `\n${index + 1}. Source: ${source}, Page: ${page}, Score: ${score}`;
+              });
+            }
+          },
+          onToken: (token) => {
+            llmResponse += token;
+            showResponse();
+          },
+          onDone: (payload) => {
+            // Answers without tokens, e.g. when no documents matched, only carry a message
+            doneMessage = payload?.message || "";
+          },
+        });
+
+        // Replace the streaming message with the final response
         setMessages((prevMessages) =>
           prevMessages
-            .filter((msg) => msg.type !== "system") // Remove "LLM is thinking..."
-            .concat({ type: "llm", text: `${llmResponse}${groundingInfo}` })
+            .filter((msg) => msg.type !== "system" && !msg.streaming)
+            .concat({ type: "llm", text: `${llmResponse || doneMessage || "No response from LLM."}${groundingInfo}` })
         );
       } catch (error) {
+        // Error events and streams cut off before their done event end up here
         console.error("Error fetching LLM response:", error);
         setMessages((prevMessages) =>
           prevMessages
-            .filter((msg) => msg.type !== "system") // Remove "LLM is thinking..."
-            .concat({ type: "llm", text: "Error: Unable to fetch response from the API." })
+            .filter((msg) => msg.type !== "system" && !msg.streaming) // Remove "LLM is thinking..." and the partial answer
+            .concat({ type: "llm", text: `Error: ${error.message || "Unable to fetch response from the API."}` })
         );
+      } finally {
+        // Hide "LLM is thinking..." message
+        setLoading(false);
+        setInput(""); // Clear the input box
       }
-
-      // Hide "LLM is thinking..." message
-      setLoading(false);
-      setInput(""); // Clear the input box
     }
   };
 
@@ -186,6 +202,7 @@ function ChatWithLLM({ messages, setMessages }) {
           }}
         >
           <option value="chroma">Chroma</option>
+          <option value="local">Local</option>
           <option value="vertexai">Vertex AI</option>
           <option value="mongodb">MongoDB</option>
         </select>
@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { uploadDocument, documentSimilarity } from "../api/apiService";
+import { uploadDocument, getJobStatus, documentSimilarity } from "../api/apiService";
 
 function UploadDocument() {
   // States for Uploading (Embedding)
@@ -25,7 +25,23 @@ function UploadDocument() {
     try {
       setEmbedStatus("Uploading...");
       const response = await uploadDocument(uploadFile, vectorStore);
-      setEmbedStatus(`Upload successful: ${response.message}`);
+
+      // Poll the ingestion job until it finishes
+      let job = await getJobStatus(response.job_id);
+      while (job.status === "queued" || job.status === "running") {
+        const { pages_parsed, chunks_total, chunks_embedded, chunks_written } = job.progress;
+        setEmbedStatus(
+          `Processing... pages parsed: ${pages_parsed}, chunks embedded: ${chunks_embedded}/${chunks_total}, chunks written: ${chunks_written}/${chunks_total}`
+        );
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await getJobStatus(response.job_id);
+      }
+
+      if (job.status === "completed") {
+        setEmbedStatus(`Upload successful: ${job.progress.chunks_written} chunks embedded.`);
+      } else {
+        setEmbedStatus(`Upload failed: ${job.error || job.status}`);
+      }
     } catch (error) {
       console.error("Upload failed:", error);
       setEmbedStatus("Upload failed. Please try again.");
@@ -69,6 +85,7 @@ function UploadDocument() {
         <input type="file" onChange={(e) => setUploadFile(e.target.files[0])} />
         <select value={vectorStore} onChange={(e) => setVectorStore(e.target.value)} style={{ marginLeft: "10px" }}>
           <option value="chroma">Chroma</option>
+          <option value="local">Local</option>
           <option value="vertexai">Vertex AI</option>
           <option value="mongodb">MongoDB</option>
         </select>
@@ -84,6 +101,7 @@ function UploadDocument() {
         <input type="file" onChange={(e) => setSimilarityFile(e.target.files[0])} />
         <select value={similarityVectorStore} onChange={(e) => setSimilarityVectorStore(e.target.value)} style={{ marginLeft: "10px" }}>
           <option value="chroma">Chroma</option>
+          <option value="local">Local</option>
           <option value="vertexai">Vertex AI</option>
           <option value="mongodb">MongoDB</option>
         </select>
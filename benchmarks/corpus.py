@@ -0,0 +1,85 @@
+import random
+
+WORDS = (
+    "contract clause liability warranty invoice payment schedule delivery supplier customer "
+    "report revenue forecast quarter margin growth risk audit compliance policy security "
+    "network server latency throughput storage backup region cluster deployment release "
+    "engine turbine pressure valve sensor calibration maintenance inspection safety part "
+    "patient dosage trial outcome protocol cohort analysis result method sample control"
+).split()
+
+def make_sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def make_text(rng, paragraphs, sentences_per_paragraph=6):
+    """Random prose with a unique id per paragraph, so searches have exact-term targets."""
+    return "\n\n".join(
+        f"Section {rng.randrange(10**6):06d}. " + " ".join(make_sentence(rng) for _ in range(sentences_per_paragraph))
+        for _ in range(paragraphs)
+    )
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages):
+    """
+    Build a minimal PDF with one Helvetica text page per entry of `pages`.
+
+    Args:
+        pages (list[str]): Text of each page. Newlines start new text lines.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        lines = [line[i:i + 90] for line in text.split("\n") for i in range(0, max(len(line), 1), 90)]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines[:60]) + " ET"
+        stream = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_refs)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def make_corpus(documents, pages_per_document, seed=0):
+    """
+    Generate synthetic uploads, alternating text and PDF files.
+
+    Returns:
+        list[tuple[str, bytes, str]]: `(filename, content, content_type)` for each document.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(documents):
+        pages = [make_text(rng, paragraphs=4) for _ in range(pages_per_document)]
+        if index % 2:
+            corpus.append((f"doc-{index:04d}.pdf", make_pdf(pages), "application/pdf"))
+        else:
+            corpus.append((f"doc-{index:04d}.txt", "\n\n".join(pages).encode("utf-8"), "text/plain"))
+    return corpus
+
+def make_queries(count, seed=1):
+    """Generate distinct short questions over the corpus vocabulary."""
+    rng = random.Random(seed)
+    return [f"What does the {rng.choice(WORDS)} say about {rng.choice(WORDS)} and {rng.choice(WORDS)} #{i}?" for i in range(count)]
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import re
+import time
+from types import SimpleNamespace
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embedder.
+
+    Each token is hashed into one of `dim` buckets with a hashed sign, and the vector is
+    L2-normalized, so texts sharing words get nearby vectors. `latency` seconds are spent
+    once per call to simulate one embedding HTTP round trip.
+    """
+
+    def __init__(self, dim=256, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class _FakeStream:
+    def __init__(self, tokens, token_delay):
+        self._tokens = tokens
+        self._token_delay = token_delay
+
+    async def _chunks(self):
+        for token in self._tokens:
+            if self._token_delay:
+                await asyncio.sleep(self._token_delay)
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def __aiter__(self):
+        return self._chunks()
+
+class _FakeCompletions:
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        self._client.calls += 1
+        await asyncio.sleep(self._client.latency)
+        prompt = messages[-1]["content"]
+        answer = f"Stand-in answer from {model} for a prompt of {len(prompt)} characters."
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(answer) // 4)
+        if stream:
+            return _FakeStream([word + " " for word in answer.split()], self._client.token_delay)
+        message = SimpleNamespace(content=answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+class FakeChatClient:
+    """
+    Offline stand-in for `AsyncOpenAI` chat completions.
+
+    `latency` seconds pass before the first token. Streams then yield one word
+    every `token_delay` seconds.
+    """
+
+    def __init__(self, latency=0.0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    async def close(self):
+        pass
@@ -0,0 +1,77 @@
+"""
+Recall check of the local vector store's IVF search at the configured settings.
+
+Synthetic vectors are written to a local store in a temporary directory with the settings
+from app.core.config, then searched through the store and exactly with NumPy. The data is
+drawn around random topic centers with enough noise that topics overlap, which is harder
+than typical text embeddings. By default the store holds LOCAL_STORE_IVF_MIN_ROWS rows, so
+the IVF index is used.
+
+Usage:
+    python -m benchmarks.recall --rows 100000 --dim 64 --min-recall 0.7
+
+Exits with status 1 when recall@k is below --min-recall.
+"""
+import argparse
+import sys
+import tempfile
+import time
+import numpy as np
+
+def parse_args(argv=None):
+    from app.core.config import LOCAL_STORE_IVF_MIN_ROWS
+    parser = argparse.ArgumentParser(description="Check the recall of the local vector store's IVF search.")
+    parser.add_argument("--rows", type=int, default=LOCAL_STORE_IVF_MIN_ROWS, help="Vectors to store.")
+    parser.add_argument("--dim", type=int, default=64, help="Dimension of the vectors.")
+    parser.add_argument("--topics", type=int, default=1000, help="Number of topic centers the vectors are drawn around.")
+    parser.add_argument("--noise", type=float, default=1.5, help="Standard deviation of the vectors around their topic.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries.")
+    parser.add_argument("--k", type=int, default=10, help="Results per query.")
+    parser.add_argument("--min-recall", type=float, default=0.7, help="Lowest recall@k that passes.")
+    return parser.parse_args(argv)
+
+def make_vectors(rng, centers, count, noise):
+    topics = rng.integers(len(centers), size=count)
+    return (centers[topics] + noise * rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+
+def main(argv=None):
+    args = parse_args(argv)
+    from app.utils.local_store import LocalVectorStore
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.topics, args.dim)).astype(np.float32)
+    vectors = make_vectors(rng, centers, args.rows, args.noise)
+    queries = make_vectors(rng, centers, args.queries, args.noise)
+
+    with tempfile.TemporaryDirectory(prefix="rag-recall-") as directory:
+        store = LocalVectorStore(directory, embedding_function=None)
+        for start in range(0, args.rows, 1000):
+            batch = range(start, min(start + 1000, args.rows))
+            store.add_embeddings([""] * len(batch), vectors[start:batch.stop], ids=[str(row) for row in batch])
+            # Retraining runs in the background; wait so every training point of a real load is reached
+            store.wait_for_training()
+        started = time.perf_counter()
+        results = store.search_by_vectors(queries, args.k)
+        search_seconds = time.perf_counter() - started
+        lists = 0 if store._centroids is None else len(store._centroids)
+        store.close()
+
+    norms = (vectors ** 2).sum(axis=1)
+    hits_at_1 = hits_at_k = 0
+    for query, result in zip(queries, results):
+        exact = np.argsort(norms - 2.0 * (vectors @ query))[:args.k]
+        found = [int(record_id) for record_id, _, _ in result]
+        hits_at_1 += bool(found) and found[0] == exact[0]
+        hits_at_k += len(set(found) & set(exact.tolist()))
+    recall_at_1 = hits_at_1 / len(queries)
+    recall_at_k = hits_at_k / (len(queries) * args.k)
+
+    print(f"rows={args.rows} dim={args.dim} lists={lists} nprobe={store.nprobe} probe_fraction={store.probe_fraction}")
+    print(f"recall@1={recall_at_1:.3f} recall@{args.k}={recall_at_k:.3f} "
+          f"search={1000.0 * search_seconds / len(queries):.2f}ms/query")
+    if recall_at_k < args.min_recall:
+        print(f"recall@{args.k} is below {args.min_recall}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+End-to-end benchmark of the RAG API with offline stand-ins for OpenAI.
+
+The FastAPI app runs in-process behind an httpx ASGI transport, with a deterministic hashing
+embedder and a fake chat model in place of the OpenAI clients. Every run uses a fresh temporary
+data directory, so results do not depend on earlier runs.
+
+Usage:
+    python -m benchmarks.run --documents 20 --pages 10 --concurrency 1,4,16 --output bench.json
+
+For each endpoint and concurrency level the report has the request count, throughput in
+requests per second, and p50/p95/p99/max latency in milliseconds; text_similarity_batch also
+reports queries per second. Each upload level ingests its own synthetic documents. The
+report is written to benchmarks/output/bench_output.json unless --output is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+ENDPOINTS = ("upload", "text_similarity", "text_similarity_batch", "document_similarity", "inspect")
+
+# Reports land next to the benchmarks in a git-ignored directory unless --output is given
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "bench_output.json")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RAG API with offline OpenAI stand-ins.")
+    parser.add_argument("--documents", type=int, default=20, help="Number of synthetic documents to upload.")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per synthetic document.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint and concurrency level.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to run.")
+    parser.add_argument("--vector-store", default="chroma", help="Vector store type to benchmark.")
+    parser.add_argument("--top-n", type=int, default=5, help="top_n for similarity requests.")
+    parser.add_argument("--search-mode", default="vector", help="text_similarity search mode: vector, lexical or hybrid.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per text_similarity_batch request.")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per stand-in embedding call.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds before the stand-in LLM answers.")
+    parser.add_argument("--embed-dim", type=int, default=256, help="Dimension of the stand-in embeddings.")
+    parser.add_argument("--query-cache", action="store_true", help="Keep the query response cache enabled.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Path of the JSON report; defaults to benchmarks/output/bench_output.json.")
+    return parser.parse_args(argv)
+
+def summarize(latencies, wall_time):
+    """Throughput and latency percentiles of one measured batch of requests."""
+    values = np.asarray(latencies) * 1000.0
+    return {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / wall_time, 2) if wall_time else None,
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+async def measure(make_request, count, concurrency):
+    """Run `count` calls of `make_request(i)` with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            await make_request(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return summarize(latencies, time.perf_counter() - started)
+
+async def wait_for_job(client, job_id):
+    while True:
+        response = await client.get(f"/api/jobs/{job_id}")
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] == "completed":
+            return job
+        if job["status"] in ("failed", "cancelled"):
+            raise RuntimeError(f"Ingestion job {job_id} {job['status']}: {job['error']}")
+        await asyncio.sleep(0.01)
+
+async def run(args):
+    import httpx
+    from app.main import app
+    from app.core.registry import registry
+    from benchmarks.corpus import make_corpus, make_queries
+    from benchmarks.fakes import HashingEmbeddings, FakeChatClient
+
+    embeddings = HashingEmbeddings(dim=args.embed_dim, latency=args.embed_latency)
+    registry.use_embeddings(embeddings)
+    registry.use_llm_client(FakeChatClient(latency=args.llm_latency))
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    endpoints = [endpoint for endpoint in args.endpoints.split(",") if endpoint]
+    corpus = make_corpus(args.documents, args.pages)
+    queries = make_queries(args.requests * len(levels) * max(1, args.batch_size))
+    results = {endpoint: {} for endpoint in endpoints}
+    store = args.vector_store
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            # The corpus is always ingested once so the query endpoints have data. Each upload
+            # level gets its own documents, so it measures ingestion rather than dedupe skips
+            upload_levels = levels if "upload" in endpoints else [max(levels)]
+            for position, level in enumerate(upload_levels):
+                documents = corpus if position == 0 else make_corpus(args.documents, args.pages, seed=position)
+
+                async def upload(index):
+                    name, content, content_type = documents[index % len(documents)]
+                    response = await client.post(
+                        "/api/upload/",
+                        params={"vector_store_type": store},
+                        files={"file": (f"{level}-{index}-{name}", content, content_type)},
+                    )
+                    response.raise_for_status()
+                    await wait_for_job(client, response.json()["job_id"])
+
+                summary = await measure(upload, len(documents), level)
+                if "upload" in endpoints:
+                    results["upload"][level] = summary
+
+            for position, level in enumerate(levels):
+                offset = position * args.requests
+
+                async def text_similarity(index):
+                    response = await client.post("/api/text_similarity/", json={
+                        "query": queries[offset + index],
+                        "top_n": args.top_n,
+                        "llm_type": "gpt-4o",
+                        "vector_store_type": store,
+                        "search_mode": args.search_mode,
+                    })
+                    response.raise_for_status()
+
+                async def text_similarity_batch(index):
+                    start = (offset + index) * args.batch_size
+                    response = await client.post("/api/text_similarity/batch", json={
+                        "queries": queries[start:start + args.batch_size],
+                        "top_n": args.top_n,
+                        "llm_type": "gpt-4o",
+                        "vector_store_type": store,
+                    })
+                    response.raise_for_status()
+
+                async def document_similarity(index):
+                    name, content, content_type = corpus[index % len(corpus)]
+                    response = await client.post(
+                        "/api/document_similarity/",
+                        params={"top_n": args.top_n, "vector_store_type": store},
+                        files={"file": (name, content, content_type)},
+                    )
+                    response.raise_for_status()
+
+                async def inspect(index):
+                    response = await client.get("/api/inspect/", params={"limit": 100, "vector_store_type": store})
+                    response.raise_for_status()
+
+                for name, request in (("text_similarity", text_similarity),
+                                      ("text_similarity_batch", text_similarity_batch),
+                                      ("document_similarity", document_similarity),
+                                      ("inspect", inspect)):
+                    if name in endpoints:
+                        results[name][level] = await measure(request, args.requests, level)
+                if "text_similarity_batch" in endpoints:
+                    summary = results["text_similarity_batch"][level]
+                    summary["queries_per_second"] = round(summary["throughput_rps"] * args.batch_size, 2)
+
+    return {
+        "config": vars(args),
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+        "stand_ins": {"embedding_calls": embeddings.calls},
+        "results": results,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as data_dir:
+        # Isolate every file the app writes; must be set before the app modules are imported
+        os.environ["DATABASE_DIR"] = os.path.join(data_dir, "database")
+        os.environ["BACKUP_DIR"] = os.path.join(data_dir, "backup")
+        os.environ["EMBED_CACHE_PATH"] = os.path.join(data_dir, "cache", "embeddings.sqlite3")
+        os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+        if not args.query_cache:
+            os.environ["QUERY_CACHE_TTL_SECONDS"] = "0"
+        os.makedirs(os.environ["DATABASE_DIR"], exist_ok=True)
+        os.makedirs(os.environ["BACKUP_DIR"], exist_ok=True)
+        report = asyncio.run(run(args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for endpoint, levels in report["results"].items():
+        for level, summary in levels.items():
+            print(f"{endpoint:<20} c={level:<4} {summary['throughput_rps']:>8} req/s  "
+                  f"p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms")
+    print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()